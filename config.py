@@ -1,14 +1,40 @@
 import os
-from dotenv import load_dotenv
 from datetime import datetime
 
-# Load environment variables
-load_dotenv()
+# Settings read from the environment (.env) or computed at run time are
+# resolved on first access, so importing config stays cheap
+_LAZY_SETTINGS = {
+    # API config
+    "API_KEY": lambda: os.getenv("RIOT_API_KEY"),
+    # Several keys can be given as a comma-separated RIOT_API_KEYS. They must all
+    # belong to the same application: PUUIDs are encrypted per application, so
+    # keys of another one are taken out of the pool when first used
+    "API_KEYS": lambda: [key.strip() for key in os.getenv("RIOT_API_KEYS", os.getenv("RIOT_API_KEY", "")).split(",")
+                         if key.strip()],
+    "DEFAULT_REGION": lambda: os.getenv("RIOT_REGION", "americas"),
+    "DEFAULT_ROUTE": lambda: os.getenv("RIOT_REGIONAL_ROUTE", "na1"),
+    # Excel config
+    "DEFAULT_EXCEL_PATH": lambda: f"tournament_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+}
+
+_environment_loaded = False
+
+def load_environment():
+    """Load environment variables from the .env file (once)"""
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _environment_loaded = True
 
-# API config
-API_KEY = os.getenv("RIOT_API_KEY")
-DEFAULT_REGION = os.getenv("RIOT_REGION", "americas")
-DEFAULT_ROUTE = os.getenv("RIOT_REGIONAL_ROUTE", "na1")
+def __getattr__(name):
+    if name not in _LAZY_SETTINGS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    
+    load_environment()
+    value = _LAZY_SETTINGS[name]()
+    globals()[name] = value
+    return value
 
 # Region mappings
 REGION_MAP = {
@@ -25,15 +51,36 @@ REGION_MAP = {
     "tr": "europe"
 }
 
+# Rate limits of each API key in each region, as (requests, seconds) windows.
+# They are replaced by the limits reported in the X-App-Rate-Limit header.
+API_RATE_LIMITS = [(20, 1), (100, 120)]
+# Retries of a request that was rate limited (429)
+API_MAX_RETRIES = 3
+
 # Excel config
-DEFAULT_EXCEL_PATH = f"tournament_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
 SHEET_NAME = "Tournament Stats"
 
-# Column headers for Excel
-EXCEL_HEADERS = [
-    "Summoner Name", "Champion", "Position", "K/D/A", "KDA Ratio", 
-    "DPM", "VPM", "CS/min", "Gold Diff@15", "Exp Diff@15", "Solo Kills", "KP", "Win"
-]
+# Column headers for Excel are declared with their stats in stats/registry.py
+
+# Summary sheets and their column headers
+PLAYER_SUMMARY_SHEET = "Player Summary"
+CHAMPION_SUMMARY_SHEET = "Champion Summary"
+DAY_SUMMARY_SHEET = "Day Summary"
+
+SUMMARY_HEADERS = {
+    PLAYER_SUMMARY_SHEET: [
+        "Summoner Name", "Games", "Wins", "Win %", "K/D/A", "KDA Ratio", "DPM", "VPM",
+        "CS/min", "Gold Diff@15", "Exp Diff@15", "Solo Kills", "KP", "Champions"
+    ],
+    CHAMPION_SUMMARY_SHEET: [
+        "Champion", "Picks", "Wins", "Win %", "K/D/A", "KDA Ratio", "DPM", "VPM",
+        "CS/min", "Gold Diff@15", "Solo Kills", "KP", "Players"
+    ],
+    DAY_SUMMARY_SHEET: [
+        "Day", "Side", "Games", "Wins", "Win %", "Avg Kills", "Avg Deaths", "Avg Assists",
+        "Avg DPM", "Avg VPM", "Avg CS/min"
+    ],
+}
 
 # Colors for Excel
 COLORS = {
@@ -44,6 +91,36 @@ COLORS = {
     "loss": "FFC7CE"
 }
 
+# Run journal and local payload cache
+JOURNAL_FILE = "lol_tournament_stats.journal.jsonl"
+PAYLOAD_DIR = "payloads"
+RECOMPUTE_PROCESSES = None  # Processes re-deriving stats from stored payloads (None for one per CPU)
+WRITE_BATCH_SIZE = 10  # Codes extracted before stats are flushed to Excel
+
+# Tournament callback receiver
+CALLBACK_HOST = "127.0.0.1"
+CALLBACK_PORT = 8080
+CALLBACK_DEBOUNCE = 2  # Seconds without new games before the workbook is saved
+CALLBACK_MAX_DELAY = 10  # Maximum seconds a finished game waits before being saved
+CALLBACK_RETRY_DELAYS = [5, 15, 30, 60]  # Seconds to wait for a match to become available
+CALLBACK_WRITE_RETRY_DELAYS = [5, 15, 30, 60]  # Seconds before retrying a failed write (the last one repeats)
+
+# Player names, cached by PUUID
+IDENTITY_CACHE_FILE = "player_names.json"
+IDENTITY_TTL = 7 * 24 * 3600  # Seconds before a cached name is looked up again
+IDENTITY_LOOKUP_THREADS = 5  # Concurrent account lookups
+
+# Job queue shared by worker processes
+JOB_QUEUE_FILE = "lol_tournament_stats.queue.sqlite"
+JOB_LEASE = 120  # Seconds a worker holds a job before another worker may take it over
+JOB_MAX_ATTEMPTS = 5  # Claims of a job before it is left as failed
+JOB_RETRY_DELAY = 30  # Seconds before a failed job is retried, times its number of attempts
+JOB_POLL_INTERVAL = 2  # Seconds between checks for new work
+
+# Profiling (--profile)
+PROFILE_DIR = "profiles"  # Run directories of profiling reports
+PROFILE_TOP_LINES = 30  # Functions and allocation sites listed per stage report
+
 # Logging config
 LOG_FILE = "lol_tournament_stats.log"
 LOG_LEVEL = "DEBUG"  # DEBUG, INFO, WARNING, ERROR, CRITICAL
\ No newline at end of file
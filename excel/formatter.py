@@ -1,50 +1,90 @@
 import logging
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell.cell import Cell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 from config import COLORS
 
 logger = logging.getLogger(__name__)
 
-def apply_header_style(cell):
-    """Apply header styling to a cell"""
-    cell.fill = PatternFill(start_color=COLORS["header"], end_color=COLORS["header"], fill_type="solid")
-    cell.font = Font(color="FFFFFF", bold=True)
-    cell.border = Border(left=Side(style='thin'), right=Side(style='thin'),
-                        top=Side(style='thin'), bottom=Side(style='thin'))
-    cell.alignment = Alignment(horizontal='center')
-
-def apply_day_style(cell):
-    """Apply day header styling to a cell"""
-    cell.fill = PatternFill(start_color=COLORS["day"], end_color=COLORS["day"], fill_type="solid")
-    cell.font = Font(bold=True)
-    cell.alignment = Alignment(horizontal='center')
-
-def apply_match_style(cell):
-    """Apply match header styling to a cell"""
-    cell.fill = PatternFill(start_color=COLORS["match"], end_color=COLORS["match"], fill_type="solid")
-    cell.font = Font(bold=True)
-    cell.alignment = Alignment(horizontal='center')
-
-def apply_win_loss_style(cell, is_win):
-    """Apply win/loss styling to a cell"""
-    if is_win:
-        cell.fill = PatternFill(start_color=COLORS["win"], end_color=COLORS["win"], fill_type="solid")
-    else:
-        cell.fill = PatternFill(start_color=COLORS["loss"], end_color=COLORS["loss"], fill_type="solid")
-
-def adjust_columns_width(worksheet, min_width=10, max_width=40):
-    """Auto-adjust column widths based on content"""
-    for column in worksheet.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
+# Named style registered for each cell role of the stats sheet
+STYLE_NAMES = {
+    "header": "LoL Header",
+    "day": "LoL Day",
+    "match": "LoL Match",
+    "player": "LoL Player",
+    "win": "LoL Win",
+    "loss": "LoL Loss",
+}
+
+def _solid_fill(color):
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+def build_named_styles():
+    """Build the named styles of the stats sheet, keyed by cell role"""
+    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                         top=Side(style='thin'), bottom=Side(style='thin'))
+    centered = Alignment(horizontal='center')
+    
+    return {
+        "header": NamedStyle(name=STYLE_NAMES["header"], font=Font(color="FFFFFF", bold=True),
+                             fill=_solid_fill(COLORS["header"]), border=thin_border, alignment=centered),
+        "day": NamedStyle(name=STYLE_NAMES["day"], font=Font(bold=True),
+                          fill=_solid_fill(COLORS["day"]), alignment=centered),
+        "match": NamedStyle(name=STYLE_NAMES["match"], font=Font(bold=True),
+                            fill=_solid_fill(COLORS["match"]), alignment=centered),
+        "player": NamedStyle(name=STYLE_NAMES["player"], border=thin_border),
+        "win": NamedStyle(name=STYLE_NAMES["win"], fill=_solid_fill(COLORS["win"]), border=thin_border),
+        "loss": NamedStyle(name=STYLE_NAMES["loss"], fill=_solid_fill(COLORS["loss"]), border=thin_border),
+    }
+
+def register_named_styles(wb):
+    """Register the stats sheet's named styles on a workbook if missing"""
+    for style in build_named_styles().values():
+        if style.name not in wb.named_styles:
+            wb.add_named_style(style)
+            logger.debug(f"Registered named style: {style.name}")
+
+def build_role_style_arrays(ws):
+    """Resolve each cell role to a style array that new cells can share
+
+    The named styles must already be registered on the workbook. Cells built
+    from these arrays all point at the same few entries of the style table.
+    """
+    style_arrays = {}
+    for role, name in STYLE_NAMES.items():
+        template = Cell(ws)
+        template.style = name
+        style_arrays[role] = template._style
+    return style_arrays
+
+def styled_cells(worksheet, style_arrays, cells):
+    """Build a row of new cells from (value, style role) pairs"""
+    return [Cell(worksheet, value=value, style_array=style_arrays[role]) for value, role in cells]
+
+def update_content_widths(content_widths, values):
+    """Update the running max content length of each column with a row of values"""
+    for col, value in enumerate(values, 1):
+        if value is None or value == "":
+            continue
+        length = len(str(value))
+        if length > content_widths.get(col, 0):
+            content_widths[col] = length
+
+def column_width(content_width, min_width=10, max_width=40):
+    """Get the column width that fits content of the given length"""
+    return max(min_width, min(content_width + 2, max_width))
+
+def apply_column_widths(worksheet, content_widths):
+    """Widen columns to fit newly written content
+
+    Widths already stored on the sheet act as the running max from previous
+    runs, so existing cells never need to be rescanned.
+    """
+    for col, content_width in content_widths.items():
+        column_letter = get_column_letter(col)
+        width = column_width(content_width)
         
-        for cell in column:
-            if cell.value:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
+        if column_letter in worksheet.column_dimensions:
+            width = max(width, worksheet.column_dimensions[column_letter].width or 0)
         
-        adjusted_width = max(min_width, min(max_length + 2, max_width))
-        worksheet.column_dimensions[column_letter].width = adjusted_width
\ No newline at end of file
+        worksheet.column_dimensions[column_letter].width = width
@@ -0,0 +1,579 @@
+import logging
+import os
+import re
+import shutil
+import struct
+import tempfile
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+from openpyxl.utils import get_column_letter
+from config import SHEET_NAME
+from excel.formatter import STYLE_NAMES, update_content_widths, column_width
+from excel.store import load_layout, save_layout
+from stats.registry import excel_headers
+
+logger = logging.getLogger(__name__)
+
+NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+PROCESSED_SHEET = "ProcessedMatches"
+
+ROW_NUMBER = re.compile(r'<row [^>]*?\br="(\d+)"')
+COLS = re.compile(r"<cols>(.*?)</cols>", re.S)
+COL_ATTRIBUTES = re.compile(r"<col\b([^>]*?)/?>")
+ATTRIBUTE = re.compile(r'(\w+)="([^"]*)"')
+DIMENSION = re.compile(r'<dimension ref="[^"]*"\s*/>')
+MERGE_CELLS = re.compile(r'<mergeCells(?: count="(\d+)")?\s*>')
+
+# Worksheet elements that come between sheetData and mergeCells
+BEFORE_MERGE_CELLS = ("sheetCalcPr", "sheetProtection", "protectedRanges", "scenarios", "autoFilter",
+                      "sortState", "dataConsolidate", "customSheetViews")
+
+def find_role_styles(styles_xml):
+    """Find the cellXfs index of the named style registered for each cell role
+
+    Returns None if one of the named styles is not registered yet.
+    """
+    root = ET.fromstring(styles_xml)
+
+    named_xf_ids = {style.get("name"): style.get("xfId") for style in root.iter(f"{NS}cellStyle")}
+
+    cell_xfs = {}
+    for index, xf in enumerate(root.find(f"{NS}cellXfs")):
+        cell_xfs.setdefault(xf.get("xfId"), index)
+
+    role_styles = {}
+    for role, name in STYLE_NAMES.items():
+        index = cell_xfs.get(named_xf_ids.get(name))
+        if index is None:
+            logger.debug(f"No cell style registered for named style: {name}")
+            return None
+        role_styles[role] = index
+    return role_styles
+
+def _find_sheet_paths(zf):
+    """Map sheet names to their part names inside the xlsx archive, in workbook order"""
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+
+    targets = {}
+    for rel in rels.iter(f"{PKG_REL_NS}Relationship"):
+        target = rel.get("Target")
+        targets[rel.get("Id")] = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+
+    sheets = []
+    for sheet in workbook.iter(f"{NS}sheet"):
+        sheets.append((sheet.get("name"), targets.get(sheet.get(f"{REL_NS}id"))))
+    return sheets
+
+def _read_shared_strings(zf, indexes):
+    """Read only the shared strings at the given indexes"""
+    if not indexes or "xl/sharedStrings.xml" not in zf.namelist():
+        return {}
+
+    strings = {}
+    remaining = set(indexes)
+    with zf.open("xl/sharedStrings.xml") as f:
+        index = 0
+        for _, element in ET.iterparse(f):
+            if element.tag != f"{NS}si":
+                continue
+            if index in remaining:
+                strings[index] = "".join(t.text or "" for t in element.iter(f"{NS}t"))
+                remaining.discard(index)
+                if not remaining:
+                    break
+            element.clear()
+            index += 1
+    return strings
+
+def _read_first_column(zf, sheet_path):
+    """Read the values of column A of a sheet, skipping the header row"""
+    root = ET.fromstring(zf.read(sheet_path))
+
+    cells = []
+    for row in root.iter(f"{NS}row"):
+        if row.get("r") == "1":
+            continue
+        cell = row.find(f"{NS}c")
+        if cell is None or not cell.get("r", "A").startswith("A"):
+            continue
+        cells.append(cell)
+
+    shared = _read_shared_strings(zf, [int(c.findtext(f"{NS}v")) for c in cells if c.get("t") == "s"])
+
+    values = []
+    for cell in cells:
+        if cell.get("t") == "s":
+            values.append(shared.get(int(cell.findtext(f"{NS}v"))))
+        elif cell.get("t") == "inlineStr":
+            values.append("".join(t.text or "" for t in cell.iter(f"{NS}t")))
+        else:
+            values.append(cell.findtext(f"{NS}v"))
+    return [v for v in values if v]
+
+def read_processed_matches(excel_path):
+    """Get the processed match IDs straight from the xlsx archive
+
+    Returns None if the workbook has no ProcessedMatches sheet or cannot be read.
+    """
+    try:
+        with zipfile.ZipFile(excel_path) as zf:
+            sheet_path = dict(_find_sheet_paths(zf)).get(PROCESSED_SHEET)
+            if not sheet_path:
+                return None
+            processed_matches = set(_read_first_column(zf, sheet_path))
+
+        logger.info(f"Found {len(processed_matches)} already processed match IDs")
+        return processed_matches
+
+    except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+        logger.warning(f"Could not read processed matches in place: {str(e)}")
+        return None
+
+def _cell_xml(ref, value, style):
+    """Serialize a single cell"""
+    style_attr = f' s="{style}"' if style else ""
+
+    if value is None or value == "":
+        return f'<c r="{ref}"{style_attr}/>'
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{style_attr} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"{style_attr}><v>{value}</v></c>'
+
+    text = escape(str(value))
+    space = ' xml:space="preserve"' if text != text.strip() else ""
+    return f'<c r="{ref}"{style_attr} t="inlineStr"><is><t{space}>{text}</t></is></c>'
+
+def _read_sheet_xml(zf, sheet_path):
+    """Read a sheet's XML, expanding an empty <sheetData/> so rows can be inserted"""
+    sheet_xml = zf.read(sheet_path).decode("utf-8")
+    return re.sub(r"<sheetData\s*/>", "<sheetData></sheetData>", sheet_xml, count=1)
+
+def _last_row_number(rows_xml):
+    """Get the number of the last row of a sheet's rows (None if it has no number)"""
+    start = rows_xml.rfind("<row ")
+    if start == -1:
+        return 0
+
+    row_number = ROW_NUMBER.match(rows_xml, start)
+    return int(row_number.group(1)) if row_number else None
+
+def _update_column_widths(sheet_xml, content_widths):
+    """Widen the sheet's <cols> entries to fit newly written content
+
+    The stored widths are the running max from previous runs, so only the new
+    content needs to be measured.
+    """
+    if not content_widths:
+        return sheet_xml
+
+    cols = COLS.search(sheet_xml)
+    columns = {}
+    if cols:
+        for attrs in COL_ATTRIBUTES.findall(cols.group(1)):
+            attributes = dict(ATTRIBUTE.findall(attrs))
+            if attributes.get("min") != attributes.get("max"):
+                logger.debug("Column ranges found, leaving column widths untouched")
+                return sheet_xml
+            columns[int(attributes["min"])] = attributes
+
+    for col, content_width in content_widths.items():
+        attributes = columns.setdefault(col, {"min": str(col), "max": str(col)})
+        width = max(column_width(content_width), float(attributes.get("width", 0)))
+        attributes["width"] = f"{width:g}"
+        attributes["customWidth"] = "1"
+
+    cols_xml = "<cols>" + "".join(
+        "<col " + " ".join(f'{name}="{value}"' for name, value in attributes.items()) + "/>"
+        for _, attributes in sorted(columns.items())) + "</cols>"
+
+    if cols:
+        return sheet_xml[:cols.start()] + cols_xml + sheet_xml[cols.end():]
+    start = sheet_xml.find("<sheetData")
+    return sheet_xml[:start] + cols_xml + sheet_xml[start:]
+
+_ZERO_BYTE_OPERATORS = []
+
+def _gf2_times(matrix, vector):
+    total = 0
+    for row in matrix:
+        if not vector:
+            break
+        if vector & 1:
+            total ^= row
+        vector >>= 1
+    return total
+
+def _gf2_square(matrix):
+    return [_gf2_times(matrix, row) for row in matrix]
+
+def crc32_combine(crc1, crc2, length2):
+    """Get the CRC-32 of two concatenated byte strings from their CRCs and the second one's length
+
+    Port of zlib's crc32_combine: crc1 is carried over length2 zero bytes
+    with GF(2) operators computed once for every power of two.
+    """
+    if not _ZERO_BYTE_OPERATORS:
+        operator = [0xEDB88320] + [1 << bit for bit in range(31)]  # One zero bit
+        for _ in range(3):
+            operator = _gf2_square(operator)
+        operators = []
+        for _ in range(48):
+            operators.append(operator)
+            operator = _gf2_square(operator)
+        _ZERO_BYTE_OPERATORS[:] = operators
+
+    for operator in _ZERO_BYTE_OPERATORS:
+        if not length2:
+            break
+        if length2 & 1:
+            crc1 = _gf2_times(operator, crc1)
+        length2 >>= 1
+    return crc1 ^ crc2
+
+def _segment(data, final=False):
+    """Compress data as a raw deflate segment, as a (compressed bytes, size, CRC) tuple
+
+    Segments end on a byte boundary and start with an empty history, so
+    segments compressed separately can be concatenated into one deflate
+    stream, and each one decompressed on its own. Only the final segment
+    ends the stream.
+    """
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+    return compressed, len(data), zlib.crc32(data)
+
+def _join_segments(segments):
+    """Concatenate segments into one (compressed bytes, size, CRC) tuple"""
+    size = crc = 0
+    for _, segment_size, segment_crc in segments:
+        crc = crc32_combine(crc, segment_crc, segment_size)
+        size += segment_size
+    return b"".join(compressed for compressed, _, _ in segments), size, crc
+
+class SegmentedSheet:
+    """A worksheet part compressed as separate segments, so appends reuse its compressed rows
+
+    The sheet XML is stored as five deflate segments, concatenated into the
+    part's data: "head" (up to <sheetData>), "rows", "mid" (from
+    </sheetData> to the opening <mergeCells> tag), "merges" and "end". Rows
+    and merged cells only grow: their compressed bytes are kept as they
+    are and only what is appended to them is compressed, while the small
+    head, mid and end segments are compressed again on every write. The
+    position of the segments is recorded in the workbook's layout file, and
+    only trusted while the part still has the recorded size and CRC.
+    """
+
+    SEGMENTS = ["head", "rows", "mid", "merges", "end"]
+
+    def __init__(self, head, rows, mid, merges, end, merge_count, last_row):
+        self.head = head
+        self.rows = rows
+        self.mid = mid
+        self.merges = merges
+        self.end = end
+        self.merge_count = merge_count
+        self.last_row = last_row
+
+    @classmethod
+    def from_xml(cls, sheet_xml):
+        """Split a sheet's XML into segments (None if its layout is not supported)"""
+        sheet_xml = re.sub(r"<sheetData\s*/>", "<sheetData></sheetData>", sheet_xml, count=1)
+        start = sheet_xml.find("<sheetData>")
+        end = sheet_xml.rfind("</sheetData>")
+        if start == -1 or end == -1:
+            return None
+        start += len("<sheetData>")
+
+        rows_xml = sheet_xml[start:end]
+        last_row = _last_row_number(rows_xml)
+        if last_row is None:
+            return None
+
+        tail = sheet_xml[end:]
+        merge_cells = MERGE_CELLS.search(tail)
+        if merge_cells:
+            close = tail.find("</mergeCells>", merge_cells.end())
+            if close == -1:
+                return None
+            merges_xml = tail[merge_cells.end():close]
+            merge_count = int(merge_cells.group(1) or merges_xml.count("<mergeCell "))
+            mid, end_xml = tail[:merge_cells.start()], tail[close + len("</mergeCells>"):]
+        elif "<mergeCells" in tail:
+            return None
+        else:
+            merges_xml, merge_count = "", 0
+            mid, end_xml = tail[:len("</sheetData>")], tail[len("</sheetData>"):]
+
+        return cls(sheet_xml[:start], [_segment(rows_xml.encode("utf-8"))], mid,
+                   [_segment(merges_xml.encode("utf-8"))], end_xml, merge_count, last_row)
+
+    @classmethod
+    def from_part(cls, data, layout):
+        """Get the segments of a part's compressed data from their recorded layout (None if it does not match)"""
+        segments = {}
+        offset = 0
+        for name, (compressed_size, size, crc) in zip(cls.SEGMENTS, layout["segments"]):
+            segments[name] = (data[offset:offset + compressed_size], size, crc)
+            offset += compressed_size
+        if offset != len(data):
+            return None
+
+        texts = {}
+        for name in ("head", "mid", "end"):
+            compressed, size, crc = segments[name]
+            text = zlib.decompressobj(-zlib.MAX_WBITS).decompress(compressed)
+            if len(text) != size or zlib.crc32(text) != crc:
+                return None
+            texts[name] = text.decode("utf-8")
+
+        mid, end = texts["mid"], texts["end"]
+        merge_count = layout["merge_count"]
+        if merge_count:
+            tag = f'<mergeCells count="{merge_count}">'
+            if not mid.endswith(tag) or not end.startswith("</mergeCells>"):
+                return None
+            mid, end = mid[:-len(tag)], end[len("</mergeCells>"):]
+
+        return cls(texts["head"], [segments["rows"]], mid, [segments["merges"]], end, merge_count,
+                   layout["last_row"])
+
+    def append(self, rows_xml, merge_refs, last_ref, last_row, content_widths=None):
+        """Append rows and merged ranges, updating the dimension and column widths
+
+        Returns False if merged cells cannot be added to this sheet.
+        """
+        if merge_refs:
+            # mergeCells must directly follow sheetData unless other elements sit in between
+            following = re.match(r"\s*<(\w+)", self.end)
+            if not self.merge_count and following and following.group(1) in BEFORE_MERGE_CELLS:
+                return False
+            merges_xml = "".join(f'<mergeCell ref="{ref}"/>' for ref in merge_refs)
+            self.merges.append(_segment(merges_xml.encode("utf-8")))
+            self.merge_count += len(merge_refs)
+
+        if rows_xml:
+            self.rows.append(_segment(rows_xml.encode("utf-8")))
+            self.last_row = last_row
+
+        self.head = DIMENSION.sub(f'<dimension ref="A1:{last_ref}"/>', self.head, count=1)
+        self.head = _update_column_widths(self.head, content_widths)
+        return True
+
+    def compress(self):
+        """Get the part's compressed data as a (compressed bytes, size, CRC) tuple, and its layout"""
+        merge_open = f'<mergeCells count="{self.merge_count}">' if self.merge_count else ""
+        merge_close = "</mergeCells>" if self.merge_count else ""
+        segments = [
+            _segment(self.head.encode("utf-8")),
+            _join_segments(self.rows),
+            _segment((self.mid + merge_open).encode("utf-8")),
+            _join_segments(self.merges),
+            _segment((merge_close + self.end).encode("utf-8"), final=True),
+        ]
+        part = _join_segments(segments)
+
+        layout = {
+            "size": part[1],
+            "compress_size": len(part[0]),
+            "crc": part[2],
+            "segments": [[len(compressed), size, crc] for compressed, size, crc in segments],
+            "merge_count": self.merge_count,
+            "last_row": self.last_row,
+        }
+        return part, layout
+
+def _read_compressed_member(src, info):
+    """Read a member's compressed bytes"""
+    src.fp.seek(info.header_offset)
+    header = src.fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    src.fp.seek(info.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+    return src.fp.read(info.compress_size)
+
+def _write_compressed_member(dst, info, data, size=None, crc=None, compress_type=None):
+    """Write already compressed bytes as a member, with the attributes of another archive's member"""
+    copied = zipfile.ZipInfo(info.filename, info.date_time)
+    for attribute in ("compress_type", "comment", "extra", "create_system", "create_version", "extract_version",
+                      "flag_bits", "internal_attr", "external_attr", "CRC", "file_size"):
+        setattr(copied, attribute, getattr(info, attribute))
+    if size is not None:
+        copied.file_size, copied.CRC, copied.compress_type = size, crc, compress_type
+    copied.compress_size = len(data)
+    # Sizes and CRC go in the local header, so no data descriptor follows the data
+    copied.flag_bits &= ~0x08
+    copied.header_offset = dst.fp.tell()
+
+    dst.fp.write(copied.FileHeader())
+    dst.fp.write(data)
+    dst.filelist.append(copied)
+    dst.NameToInfo[copied.filename] = copied
+    dst.start_dir = dst.fp.tell()
+
+def _read_segmented_sheet(zf, sheet_path, layout):
+    """Read a sheet as segments, from its recorded layout while that still matches the part"""
+    info = zf.getinfo(sheet_path)
+    if (layout and info.compress_type == zipfile.ZIP_DEFLATED and info.CRC == layout.get("crc")
+            and info.file_size == layout.get("size") and info.compress_size == layout.get("compress_size")):
+        sheet = SegmentedSheet.from_part(_read_compressed_member(zf, info), layout)
+        if sheet is not None:
+            return sheet
+        logger.warning(f"Recorded layout of {sheet_path} does not match its data")
+
+    # Written by openpyxl (or another program) since the last append: split it once
+    logger.info(f"Splitting {sheet_path} into segments")
+    return SegmentedSheet.from_xml(zf.read(sheet_path).decode("utf-8"))
+
+def _replace_members(excel_path, replacements):
+    """Rewrite the xlsx archive with some members replaced
+
+    Replacements are XML strings, compressed here, or already compressed
+    (compressed bytes, size, CRC) tuples. Every other member's compressed
+    bytes are copied as they are. The new file is written next to the old
+    one and swapped in atomically.
+    """
+    directory = os.path.dirname(os.path.abspath(excel_path))
+    fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=directory)
+    os.close(fd)
+
+    try:
+        with zipfile.ZipFile(excel_path) as src, \
+             zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as dst:
+            for info in src.infolist():
+                replacement = replacements.get(info.filename)
+                if isinstance(replacement, str):
+                    dst.writestr(info, replacement.encode("utf-8"))
+                elif replacement is not None:
+                    data, size, crc = replacement
+                    _write_compressed_member(dst, info, data, size, crc, zipfile.ZIP_DEFLATED)
+                else:
+                    _write_compressed_member(dst, info, _read_compressed_member(src, info))
+        # mkstemp creates the file owner-only: keep the workbook's permissions
+        shutil.copymode(excel_path, tmp_path)
+        os.replace(tmp_path, excel_path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+def _build_sheet_xml(sheet_xml, headers, rows, role_styles):
+    """Replace the whole content of a small sheet, keeping its other settings"""
+    all_rows = [[(header, "header") for header in headers]]
+    all_rows += [[(value, "player") for value in values] for values in rows]
+
+    rows_xml = []
+    content_widths = {}
+    for row, cells in enumerate(all_rows, 1):
+        cells_xml = "".join(
+            _cell_xml(f"{get_column_letter(col)}{row}", value, role_styles[role])
+            for col, (value, role) in enumerate(cells, 1))
+        rows_xml.append(f'<row r="{row}">{cells_xml}</row>')
+        update_content_widths(content_widths, [value for value, _ in cells])
+
+    start = sheet_xml.find("<sheetData")
+    end = sheet_xml.find("</sheetData>") + len("</sheetData>")
+    sheet_xml = sheet_xml[:start] + "<sheetData>" + "".join(rows_xml) + "</sheetData>" + sheet_xml[end:]
+
+    last_ref = f"{get_column_letter(len(headers))}{len(all_rows)}"
+    sheet_xml = re.sub(r'<dimension ref="[^"]*"\s*/>', f'<dimension ref="A1:{last_ref}"/>', sheet_xml, count=1)
+    return _update_column_widths(sheet_xml, content_widths)
+
+def append_rows_in_place(excel_path, rows, match_ids, summary_sheets=()):
+    """Append stats rows and processed match IDs without loading the workbook
+
+    The stats and ProcessedMatches sheets are kept as separately compressed
+    segments (see SegmentedSheet), so an append only compresses the new
+    rows and the small parts around them; the (small) summary sheets are
+    rewritten as raw XML, and every other part of the archive is copied as
+    is. The first append after the workbook was saved by openpyxl (or
+    Excel) splits these sheets once, which costs as much as compressing
+    them. Returns False when the workbook does not have the expected
+    layout, in which case the caller should fall back to a full openpyxl
+    update.
+    """
+    last_col = get_column_letter(len(excel_headers()))
+    layouts = load_layout(excel_path)
+
+    try:
+        with zipfile.ZipFile(excel_path) as zf:
+            sheet_paths = dict(_find_sheet_paths(zf))
+            # The stats sheet is found by name: the active tab may be a summary sheet
+            if SHEET_NAME not in sheet_paths or PROCESSED_SHEET not in sheet_paths:
+                logger.info(f"No {SHEET_NAME} or {PROCESSED_SHEET} sheet in the workbook")
+                return False
+
+            stats_path = sheet_paths[SHEET_NAME]
+            processed_path = sheet_paths[PROCESSED_SHEET]
+
+            role_styles = find_role_styles(zf.read("xl/styles.xml"))
+            if role_styles is None:
+                return False
+
+            stats_sheet = _read_segmented_sheet(zf, stats_path, layouts.get(stats_path))
+            processed_sheet = _read_segmented_sheet(zf, processed_path, layouts.get(processed_path))
+
+            replacements = {}
+            for sheet_name, headers, summary_rows in summary_sheets:
+                summary_path = sheet_paths.get(sheet_name)
+                if not summary_path:
+                    logger.info(f"Summary sheet {sheet_name} is missing")
+                    return False
+                summary_xml = _read_sheet_xml(zf, summary_path)
+                if "</sheetData>" not in summary_xml:
+                    return False
+                replacements[summary_path] = _build_sheet_xml(summary_xml, headers, summary_rows, role_styles)
+
+    except (zipfile.BadZipFile, KeyError, ET.ParseError, UnicodeDecodeError, zlib.error) as e:
+        logger.warning(f"Cannot update workbook in place: {str(e)}")
+        return False
+
+    if stats_sheet is None or processed_sheet is None:
+        logger.warning("Unexpected sheet layout, cannot update workbook in place")
+        return False
+
+    # Leave the same gap as between two matches written in a single run
+    stats_last_row = stats_sheet.last_row
+    row = stats_last_row + 3 if stats_last_row > 1 else stats_last_row + 1
+    logger.info(f"Appending {len(rows)} rows in place from row {row}")
+
+    rows_xml = []
+    merge_refs = []
+    content_widths = {}
+    for row_cells in rows:
+        if row_cells is not None:
+            cells, merged = row_cells
+            cells_xml = "".join(
+                _cell_xml(f"{get_column_letter(col)}{row}", value, role_styles.get(role))
+                for col, (value, role) in enumerate(cells, 1))
+            rows_xml.append(f'<row r="{row}">{cells_xml}</row>')
+            if merged:
+                merge_refs.append(f"A{row}:{last_col}{row}")
+            else:
+                update_content_widths(content_widths, [value for value, _ in cells])
+        row += 1
+
+    if not stats_sheet.append("".join(rows_xml), merge_refs, f"{last_col}{row - 1}", row - 1, content_widths):
+        logger.warning("Cannot insert merged cells in place")
+        return False
+
+    processed_last_row = processed_sheet.last_row
+    processed_rows = []
+    for processed_row, match_id in enumerate(match_ids, processed_last_row + 1):
+        processed_rows.append(f'<row r="{processed_row}">{_cell_xml(f"A{processed_row}", match_id, None)}</row>')
+        logger.debug(f"Added match ID to processed list: {match_id}")
+    processed_sheet.append("".join(processed_rows), [], f"A{processed_last_row + len(match_ids)}",
+                           processed_last_row + len(match_ids))
+
+    layouts = {}
+    for sheet_path, sheet in ((stats_path, stats_sheet), (processed_path, processed_sheet)):
+        replacements[sheet_path], layouts[sheet_path] = sheet.compress()
+    _replace_members(excel_path, replacements)
+    save_layout(excel_path, layouts)
+    return True
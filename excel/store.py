@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+def get_store_path(excel_path):
+    """Get the path of the local data store kept next to a workbook"""
+    return Path(excel_path).with_suffix(".stats.jsonl")
+
+def append_to_store(excel_path, match_stats):
+    """Append written match stats to the workbook's local data store"""
+    if not match_stats:
+        return
+
+    store_path = get_store_path(excel_path)
+    with open(store_path, "a", encoding="utf-8") as f:
+        for entry in match_stats:
+            f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+    logger.debug(f"Appended {len(match_stats)} entries to {store_path}")
+
+def replace_store(excel_path, match_stats):
+    """Atomically rewrite the workbook's local data store with the given entries"""
+    store_path = get_store_path(excel_path)
+    tmp_path = store_path.with_name(store_path.name + ".tmp")
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in match_stats:
+            f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, store_path)
+
+    logger.info(f"Rewrote {store_path} with {len(match_stats)} entries")
+
+def load_store(excel_path):
+    """Load every match stats entry recorded for a workbook"""
+    store_path = get_store_path(excel_path)
+    if not store_path.exists():
+        return []
+
+    entries = []
+    with open(store_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A run interrupted mid-write can leave a partial last line
+                logger.warning(f"Skipping unreadable line {line_number} in {store_path}")
+
+    logger.info(f"Loaded {len(entries)} entries from {store_path}")
+    return entries
+
+def get_aggregates_path(excel_path):
+    """Get the path of the running summary aggregates kept next to a workbook"""
+    return Path(excel_path).with_suffix(".aggregates.json")
+
+def load_aggregates(excel_path):
+    """Load the workbook's running summary aggregates (None if not saved yet)"""
+    aggregates_path = get_aggregates_path(excel_path)
+    if not aggregates_path.exists():
+        return None
+
+    try:
+        with open(aggregates_path, encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        logger.warning(f"Unreadable aggregates in {aggregates_path}, they will be recomputed")
+        return None
+
+def save_aggregates(excel_path, aggregates):
+    """Atomically save the workbook's running summary aggregates"""
+    aggregates_path = get_aggregates_path(excel_path)
+    tmp_path = aggregates_path.with_name(aggregates_path.name + ".tmp")
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        # json.dumps encodes in C, json.dump in Python
+        f.write(json.dumps(aggregates))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, aggregates_path)
+
+def get_layout_path(excel_path):
+    """Get the path of the segment layout of a workbook's growing sheets (see excel.incremental)"""
+    return Path(excel_path).with_suffix(".layout.json")
+
+def load_layout(excel_path):
+    """Load the segment layout of the workbook's growing sheets by part name (empty if not saved yet)"""
+    layout_path = get_layout_path(excel_path)
+    if not layout_path.exists():
+        return {}
+
+    try:
+        with open(layout_path, encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        logger.warning(f"Unreadable sheet layout in {layout_path}, sheets will be split again")
+        return {}
+
+def save_layout(excel_path, layout):
+    """Atomically save the segment layout of the workbook's growing sheets"""
+    layout_path = get_layout_path(excel_path)
+    tmp_path = layout_path.with_name(layout_path.name + ".tmp")
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(layout))
+    os.replace(tmp_path, layout_path)
+
+def discard_store(excel_path):
+    """Set aside a data store left over from a workbook that no longer exists"""
+    for path in (get_store_path(excel_path), get_aggregates_path(excel_path), get_layout_path(excel_path)):
+        if path.exists():
+            backup_path = path.with_name(path.name + ".bak")
+            os.replace(path, backup_path)
+            logger.warning(f"Workbook not found, moved stale {path} to {backup_path}")
@@ -0,0 +1,181 @@
+import logging
+from config import (SHEET_NAME, PLAYER_SUMMARY_SHEET, CHAMPION_SUMMARY_SHEET, DAY_SUMMARY_SHEET,
+                    SUMMARY_HEADERS)
+from excel.store import load_aggregates, load_store
+from stats.calculator import new_summary_aggregates, update_summary_aggregates
+from stats.registry import excel_columns
+
+logger = logging.getLogger(__name__)
+
+def _average(totals, stat):
+    """Average a summed stat over the games it was recorded in"""
+    count = totals["counts"][stat]
+    return round(totals["sums"][stat] / count, 2) if count else "N/A"
+
+def _win_rate(totals):
+    return round(100 * totals["wins"] / totals["games"], 1) if totals["games"] else 0
+
+def _kda(totals):
+    if totals["deaths"] == 0:
+        return "Perfect"
+    return round((totals["kills"] + totals["assists"]) / totals["deaths"], 2)
+
+def _by_games(totals_by_key):
+    """Sort aggregate entries by number of games, then by name"""
+    return sorted(totals_by_key.items(), key=lambda item: (-item[1]["games"], item[1].get("name", item[0])))
+
+def _player_rows(players):
+    rows = []
+    for key, totals in _by_games(players):
+        rows.append([
+            totals.get("name", key),
+            totals["games"],
+            totals["wins"],
+            _win_rate(totals),
+            f"{totals['kills']}/{totals['deaths']}/{totals['assists']}",
+            _kda(totals),
+            _average(totals, "DPM"),
+            _average(totals, "VPM"),
+            _average(totals, "CSperMin"),
+            _average(totals, "goldDiffAt15"),
+            _average(totals, "expDiffAt15"),
+            totals["soloKills"],
+            f"{_average(totals, 'killParticipation')}%",
+            len(totals["picks"]),
+        ])
+    return rows
+
+def _champion_rows(champions):
+    rows = []
+    for champion, totals in _by_games(champions):
+        rows.append([
+            champion,
+            totals["games"],
+            totals["wins"],
+            _win_rate(totals),
+            f"{totals['kills']}/{totals['deaths']}/{totals['assists']}",
+            _kda(totals),
+            _average(totals, "DPM"),
+            _average(totals, "VPM"),
+            _average(totals, "CSperMin"),
+            _average(totals, "goldDiffAt15"),
+            totals["soloKills"],
+            f"{_average(totals, 'killParticipation')}%",
+            len(totals["picks"]),
+        ])
+    return rows
+
+def _day_sort_key(day):
+    return (0, int(day), "") if day.isdigit() else (1, 0, day)
+
+def _day_rows(days):
+    rows = []
+    for day in sorted(days, key=_day_sort_key):
+        for side, totals in sorted(days[day].items()):
+            games = totals["games"]
+            sums = totals["sums"]
+            rows.append([
+                f"Day {day}",
+                side,
+                games,
+                totals["wins"],
+                _win_rate(totals),
+                round(sums["totalKills"] / games, 2),
+                round(sums["totalDeaths"] / games, 2),
+                round(sums["totalAssists"] / games, 2),
+                round(sums["avgDPM"] / games, 2),
+                round(sums["avgVPM"] / games, 2),
+                round(sums["avgCSPerMin"] / games, 2),
+            ])
+    return rows
+
+def build_summary_sheets(aggregates):
+    """Lay out the summary sheets as (sheet name, headers, rows) tuples"""
+    return [
+        (PLAYER_SUMMARY_SHEET, SUMMARY_HEADERS[PLAYER_SUMMARY_SHEET], _player_rows(aggregates["players"])),
+        (CHAMPION_SUMMARY_SHEET, SUMMARY_HEADERS[CHAMPION_SUMMARY_SHEET], _champion_rows(aggregates["champions"])),
+        (DAY_SUMMARY_SHEET, SUMMARY_HEADERS[DAY_SUMMARY_SHEET], _day_rows(aggregates["days"])),
+    ]
+
+def _sheet_player(headers, values):
+    """Turn a player row of the stats sheet back into player stats"""
+    columns = {stat.header: stat.key for stat in excel_columns()}
+    player = {}
+    for header, value in zip(headers, values):
+        if header == "K/D/A" and isinstance(value, str) and value.count("/") == 2:
+            player["kills"], player["deaths"], player["assists"] = (int(part) for part in value.split("/"))
+        elif header == "Win":
+            player["win"] = value == "Win"
+        elif header in columns:
+            player[columns[header]] = value
+    return player
+
+def read_sheet_match_stats(excel_path):
+    """Read the match stats written on a workbook's stats sheet, as writer entries
+
+    Used for workbooks written before the local data store existed. The
+    sheet has no match IDs or PUUIDs, and teams are numbered 100, 200, ...
+    in the order they were written.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_path, read_only=True)
+    try:
+        entries = []
+        if SHEET_NAME not in wb.sheetnames:
+            logger.warning(f"No {SHEET_NAME} sheet in {excel_path}, nothing to seed the summaries from")
+            return entries
+        day = match_num = headers = None
+        team_stats = []
+        team_index = 0
+
+        def end_team():
+            nonlocal team_stats, team_index
+            if team_stats and headers:
+                team_index += 1
+                entries.append({"day": day, "match": match_num, "match_id": None,
+                                "team_id": 100 * team_index, "team_stats": team_stats})
+            team_stats = []
+
+        for values in wb[SHEET_NAME].iter_rows(values_only=True):
+            first = values[0] if values else None
+            rest_empty = all(value in (None, "") for value in values[1:])
+            if all(value in (None, "") for value in values):
+                end_team()
+            elif isinstance(first, str) and rest_empty and first.startswith("Day "):
+                end_team()
+                day = first[len("Day "):]
+            elif isinstance(first, str) and rest_empty and first.startswith("Match "):
+                end_team()
+                match_num, team_index = first[len("Match "):], 0
+            elif first == "Summoner Name":
+                end_team()
+                headers = list(values)
+            elif headers and day is not None:
+                team_stats.append(_sheet_player(headers, values))
+        end_team()
+    finally:
+        wb.close()
+    return entries
+
+def updated_summary_aggregates(excel_path, new_match_stats, rebuild=False):
+    """Get the workbook's running aggregates with new match stats folded in
+
+    Aggregates are read from the local data store. Workbooks written before
+    aggregates were kept are seeded once from the stored match stats, or,
+    for workbooks written before the data store existed, from their stats
+    sheet.
+    """
+    aggregates = None if rebuild else load_aggregates(excel_path)
+
+    if aggregates is None:
+        aggregates = new_summary_aggregates()
+        if not rebuild:
+            stored = load_store(excel_path)
+            if not stored:
+                stored = read_sheet_match_stats(excel_path)
+                logger.warning(f"No data store for {excel_path}, seeded the summaries from its stats sheet "
+                               f"({len(stored)} team games); players are matched by name until their next game")
+            update_summary_aggregates(aggregates, stored)
+
+    return update_summary_aggregates(aggregates, new_match_stats)
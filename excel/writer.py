@@ -1,9 +1,17 @@
 import logging
+import os
+import shutil
+import tempfile
 from pathlib import Path
 from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from config import COLORS, SHEET_NAME, EXCEL_HEADERS
+from config import SHEET_NAME
+from excel.formatter import (register_named_styles, build_role_style_arrays, styled_cells,
+                             update_content_widths, apply_column_widths)
 from stats.calculator import sort_players_by_position
+from stats.registry import excel_columns, excel_headers
+from excel.incremental import read_processed_matches, append_rows_in_place
+from excel.store import append_to_store, load_store, save_aggregates, discard_store
+from excel.summary import build_summary_sheets, updated_summary_aggregates
 
 logger = logging.getLogger(__name__)
 
@@ -44,188 +52,300 @@ def add_processed_match(wb, match_id):
     except Exception as e:
         logger.error(f"Error adding processed match: {str(e)}")
 
-def update_excel_with_stats(excel_path, all_match_stats):
-    """Update an existing Excel file or create a new one with team stats"""
-    logger.info(f"Updating Excel file: {excel_path}")
-    logger.info(f"Number of match stats to add: {len(all_match_stats)}")
+def group_stats_by_day(all_match_stats, processed_matches):
+    """Group match stats that are not processed yet by day and match number"""
+    days = {}
+    new_match_stats = []
+    for match_stats in all_match_stats:
+        # Skip already processed matches
+        match_id = match_stats["match_id"]
+        if match_id in processed_matches:
+            logger.info(f"Skipping already processed match: {match_id}")
+            continue
+        
+        day = match_stats["day"]
+        match_num = match_stats["match"]
+        team_stats = match_stats["team_stats"]
+        
+        # Sort players by position
+        team_stats = sort_players_by_position(team_stats)
+        
+        logger.debug(f"Adding day: {day}, match: {match_num}, team stats: {len(team_stats)}")
+        
+        if day not in days:
+            days[day] = {}
+        
+        if match_num not in days[day]:
+            days[day][match_num] = []
+        
+        days[day][match_num].append(team_stats)
+        new_match_stats.append(match_stats)
     
-    # Define styles
-    header_fill = PatternFill(start_color=COLORS["header"], end_color=COLORS["header"], fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True)
-    day_fill = PatternFill(start_color=COLORS["day"], end_color=COLORS["day"], fill_type="solid")
-    match_fill = PatternFill(start_color=COLORS["match"], end_color=COLORS["match"], fill_type="solid")
-    win_fill = PatternFill(start_color=COLORS["win"], end_color=COLORS["win"], fill_type="solid")
-    loss_fill = PatternFill(start_color=COLORS["loss"], end_color=COLORS["loss"], fill_type="solid")
-    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'),
-                         top=Side(style='thin'), bottom=Side(style='thin'))
+    logger.info(f"Days to process: {len(days)}")
+    return days, new_match_stats
+
+def build_block_rows(days):
+    """Lay out the day/match/team blocks as rows of (value, style role) cells
+
+    Each row is a (cells, merged) tuple, or None for an empty spacer row.
+    Merged rows span every stats column. Columns follow the stat registry.
+    """
+    rows = []
+    columns = excel_columns()
+    header_cells = [(stat.header, "header") for stat in columns]
     
-    # Define column headers
-    headers = EXCEL_HEADERS
+    for day, matches in sorted(days.items()):
+        logger.debug(f"Processing day {day} with {len(matches)} matches")
+        rows.append(([(f"Day {day}", "day")], True))
+        
+        for match_num, match_data in sorted(matches.items()):
+            logger.debug(f"Processing match {match_num} with {len(match_data)} teams")
+            rows.append(([(f"Match {match_num}", "match")], True))
+            rows.append((header_cells, False))
+            
+            # Write player data for this match
+            for team_stats in match_data:
+                logger.debug(f"Processing team with {len(team_stats)} players")
+                
+                for player in team_stats:
+                    cells = [(stat.cell(player), stat.style(player)) for stat in columns]
+                    rows.append((cells, False))
+                
+                # Add an empty row between teams
+                rows.append(None)
+            
+            # Add an empty row between matches
+            rows.append(None)
     
-    # Check if the file exists
-    file_exists = Path(excel_path).exists()
+    # Trailing spacers are recreated as the gap before the next append
+    while rows and rows[-1] is None:
+        rows.pop()
+    return rows
+
+def _unique_match_ids(match_stats):
+    """Get the distinct match IDs of some match stats, in order"""
+    return list(dict.fromkeys(entry["match_id"] for entry in match_stats))
+
+def update_excel_with_stats(excel_path, all_match_stats):
+    """Update an existing Excel file or create a new one with team stats
+
+    Existing workbooks are appended to in place when possible, without
+    loading them with openpyxl. Written stats are also recorded in the
+    workbook's local data store so the file can be rebuilt from scratch.
+    Returns False if the workbook could not be updated.
+    """
+    logger.info(f"Updating Excel file: {excel_path}")
+    logger.info(f"Number of match stats to add: {len(all_match_stats)}")
     
     try:
-        if file_exists:
-            # Load existing workbook
-            logger.info(f"Loading existing Excel file: {excel_path}")
-            wb = load_workbook(excel_path)
+        if Path(excel_path).exists():
+            processed_matches = read_processed_matches(excel_path)
             
-            # Get active sheet or create one
-            if wb.active:
-                ws = wb.active
-            else:
-                ws = wb.create_sheet(SHEET_NAME)
-                logger.info(f"Created new sheet: {SHEET_NAME}")
+            if processed_matches is not None:
+                days, new_match_stats = group_stats_by_day(all_match_stats, processed_matches)
+                
+                if not days:
+                    logger.warning("No new data to add to Excel file")
+                    return True
+                
+                rows = build_block_rows(days)
+                aggregates = updated_summary_aggregates(excel_path, new_match_stats)
+                summary_sheets = build_summary_sheets(aggregates)
+                
+                if append_rows_in_place(excel_path, rows, _unique_match_ids(new_match_stats), summary_sheets):
+                    append_to_store(excel_path, new_match_stats)
+                    save_aggregates(excel_path, aggregates)
+                    logger.info(f"Excel file updated in place: {excel_path}")
+                    return True
             
-            # Get the set of matches we've already processed
-            processed_matches = get_processed_matches(wb)
+            logger.info("Workbook cannot be updated in place, falling back to a full update")
         else:
-            # Create a new workbook
-            logger.info(f"Creating new Excel file: {excel_path}")
-            wb = Workbook()
-            ws = wb.active
-            ws.title = SHEET_NAME
-            processed_matches = set()
-            
-            # Initialize headers if it's a new file
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.border = thin_border
-                cell.alignment = Alignment(horizontal='center')
-        
-        # Find the last row with data
-        last_row = 1
-        for row in ws.iter_rows():
-            if all(cell.value is None for cell in row):
-                break
-            last_row += 1
-        
-        logger.info(f"Last row in Excel: {last_row}")
-        
-        # Group new data by day and match
-        days = {}
-        for match_stats in all_match_stats:
-            # Skip already processed matches
-            match_id = match_stats["match_id"]
-            if match_id in processed_matches:
-                logger.info(f"Skipping already processed match: {match_id}")
-                continue
-            
-            day = match_stats["day"]
-            match_num = match_stats["match"]
-            team_stats = match_stats["team_stats"]
-            
-            # Sort players by position
-            team_stats = sort_players_by_position(team_stats)
-            
-            logger.debug(f"Adding day: {day}, match: {match_num}, team stats: {len(team_stats)}")
-            
-            if day not in days:
-                days[day] = {}
-            
-            if match_num not in days[day]:
-                days[day][match_num] = []
-            
-            days[day][match_num].append(team_stats)
-            
-            # Mark this match as processed
-            add_processed_match(wb, match_id)
+            discard_store(excel_path)
         
-        logger.info(f"Days to process: {len(days)}")
+        write_workbook(excel_path, all_match_stats)
+        return True
+    
+    except Exception as e:
+        logger.error(f"Error updating Excel: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return False
+
+def matches_missing_from_store(excel_path):
+    """Get the processed match IDs of a workbook that its local data store does not hold
+    
+    Workbooks written before the data store existed list matches that can
+    only be found on their stats sheet: rebuilding them from the store
+    would drop those matches.
+    """
+    if not Path(excel_path).exists():
+        return []
+    
+    processed_matches = read_processed_matches(excel_path) or set()
+    stored = {entry["match_id"] for entry in load_store(excel_path)}
+    return sorted(processed_matches - stored)
+
+def rebuild_excel_from_store(excel_path):
+    """Recreate a workbook from scratch from its local data store
+    
+    Refuses to rebuild a workbook holding matches that are not in the
+    store. Returns False if the workbook was not rebuilt.
+    """
+    logger.info(f"Rebuilding Excel file from local data store: {excel_path}")
+    
+    missing = matches_missing_from_store(excel_path)
+    if missing:
+        logger.error(f"{len(missing)} matches of {excel_path} are not in its local data store "
+                     f"(written before the store existed?), not rebuilding: {', '.join(missing)}")
+        return False
+    
+    all_match_stats = load_store(excel_path)
+    if not all_match_stats:
+        logger.warning("Local data store is empty, nothing to rebuild")
+        return False
+    
+    try:
+        write_workbook(excel_path, all_match_stats, rebuild=True)
+        return True
+    except Exception as e:
+        logger.error(f"Error rebuilding Excel: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return False
+
+def write_workbook(excel_path, all_match_stats, rebuild=False):
+    """Load (or create) the workbook with openpyxl, add the stats and save it
+
+    The stats that were actually written are recorded in the local data
+    store, and the summary sheets are refreshed from the running aggregates.
+    """
+    # Define column headers
+    headers = excel_headers()
+    
+    if Path(excel_path).exists() and not rebuild:
+        # Load existing workbook
+        logger.info(f"Loading existing Excel file: {excel_path}")
+        wb = load_workbook(excel_path)
         
-        if not days:
-            logger.warning("No new data to add to Excel file")
-            logger.info(f"Saving workbook to {excel_path}")
-            wb.save(excel_path)
-            return
+        # Get the stats sheet by name (the active tab may be a summary sheet) or create it
+        if SHEET_NAME in wb.sheetnames:
+            ws = wb[SHEET_NAME]
+            new_sheet = False
+        else:
+            ws = wb.create_sheet(SHEET_NAME, 0)
+            logger.info(f"Created new sheet: {SHEET_NAME}")
+            new_sheet = True
         
-        # Start adding new data from the last row
-        row = last_row
+        # Get the set of matches we've already processed
+        processed_matches = get_processed_matches(wb)
+        new_file = False
+    else:
+        # Create a new workbook
+        logger.info(f"Creating new Excel file: {excel_path}")
+        wb = Workbook()
+        ws = wb.active
+        ws.title = SHEET_NAME
+        processed_matches = set()
+        new_file = new_sheet = True
+    
+    register_named_styles(wb)
+    style_arrays = build_role_style_arrays(ws)
+    
+    content_widths = {}
+    
+    if new_sheet:
+        # Initialize headers if it's a new sheet
+        ws.append(styled_cells(ws, style_arrays, [(header, "header") for header in headers]))
+        update_content_widths(content_widths, headers)
+    
+    # Find the last row with data, leaving the same gap as between two matches
+    last_row = ws.max_row
+    logger.info(f"Last row in Excel: {last_row}")
+    
+    if last_row > 1:
+        ws.append([])
+        ws.append([])
+    
+    # Group new data by day and match
+    days, new_match_stats = group_stats_by_day(all_match_stats, processed_matches)
+    
+    # Mark these matches as processed
+    for match_id in _unique_match_ids(new_match_stats):
+        add_processed_match(wb, match_id)
+    
+    # Write whole rows at once, each cell sharing its role's style
+    for row_cells in build_block_rows(days):
+        if row_cells is None:
+            ws.append([])
+            continue
         
-        # Iterate through days and matches
-        for day, matches in sorted(days.items()):
-            logger.debug(f"Processing day {day} with {len(matches)} matches")
-            
-            # Write day header
-            # Write day header
-            day_label = f"Day {day}"
-            ws.cell(row=row, column=1, value=day_label).fill = day_fill
+        cells, merged = row_cells
+        ws.append(styled_cells(ws, style_arrays, cells))
+        if merged:
+            row = ws.max_row
             ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=len(headers))
-            ws.cell(row=row, column=1).alignment = Alignment(horizontal='center')
-            ws.cell(row=row, column=1).font = Font(bold=True)
-            row += 1
-            
-            for match_num, match_data in sorted(matches.items()):
-                logger.debug(f"Processing match {match_num} with {len(match_data)} teams")
-                
-                # Write match header
-                match_label = f"Match {match_num}"
-                ws.cell(row=row, column=1, value=match_label).fill = match_fill
-                ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=len(headers))
-                ws.cell(row=row, column=1).alignment = Alignment(horizontal='center')
-                ws.cell(row=row, column=1).font = Font(bold=True)
-                row += 1
-                
-                # Write column headers
-                for col, header in enumerate(headers, 1):
-                    cell = ws.cell(row=row, column=col, value=header)
-                    cell.fill = header_fill
-                    cell.font = header_font
-                    cell.border = thin_border
-                    cell.alignment = Alignment(horizontal='center')
-                row += 1
-                
-                # Write player data for this match
-                for team_stats in match_data:
-                    logger.debug(f"Processing team with {len(team_stats)} players")
-                    
-                    for player in team_stats:
-                        # Get win/loss status for cell color
-                        is_win = player["win"]
-                        fill = win_fill if is_win else loss_fill
-                        
-                        # Write player stats
-                        ws.cell(row=row, column=1, value=player["summonerName"])
-                        ws.cell(row=row, column=2, value=player["champion"])
-                        ws.cell(row=row, column=3, value=player["position"])
-                        ws.cell(row=row, column=4, value=f"{player['kills']}/{player['deaths']}/{player['assists']}")
-                        ws.cell(row=row, column=5, value=player["kda"])
-                        ws.cell(row=row, column=6, value=player["DPM"])
-                        ws.cell(row=row, column=7, value=player["VPM"])
-                        ws.cell(row=row, column=8, value=player["CSperMin"])
-                        ws.cell(row=row, column=9, value=player["goldDiffAt15"])
-                        ws.cell(row=row, column=10, value=player["expDiffAt15"])
-                        ws.cell(row=row, column=11, value=player["soloKills"])
-                        ws.cell(row=row, column=12, value=player["killParticipation"])
-                        ws.cell(row=row, column=13, value="Win" if is_win else "Loss").fill = fill
-                        
-                        # Add border to all cells
-                        for col in range(1, len(headers) + 1):
-                            ws.cell(row=row, column=col).border = thin_border
-                        
-                        row += 1
-                    
-                    # Add an empty row between teams
-                    row += 1
-                
-                # Add an empty row between matches
-                row += 1
-        
-        # Adjust column widths
-        for col in range(1, len(headers) + 1):
-            col_letter = chr(64 + col) if col <= 26 else chr(64 + col // 26) + chr(64 + col % 26)
-            if col_letter in ws.column_dimensions:
-                ws.column_dimensions[col_letter].width = 15
-        
-        # Save the workbook
-        logger.info(f"Saving workbook to {excel_path}")
+        else:
+            update_content_widths(content_widths, [value for value, _ in cells])
+    
+    # Widen columns to fit what was just written
+    apply_column_widths(ws, content_widths)
+    
+    if not days:
+        logger.warning("No new data to add to Excel file")
+    
+    aggregates = updated_summary_aggregates(excel_path, new_match_stats, rebuild=rebuild or new_file)
+    write_summary_sheets(wb, style_arrays, build_summary_sheets(aggregates))
+    
+    # Save the workbook
+    logger.info(f"Saving workbook to {excel_path}")
+    save_workbook(wb, excel_path)
+    logger.info(f"Excel file updated: {excel_path}")
+    
+    if not rebuild:
+        append_to_store(excel_path, new_match_stats)
+    save_aggregates(excel_path, aggregates)
+
+def save_workbook(wb, excel_path):
+    """Save a workbook, replacing an existing file atomically
+    
+    The workbook is saved next to the file it replaces and swapped in once
+    complete, so a failed or interrupted save leaves the previous workbook
+    untouched.
+    """
+    if not Path(excel_path).exists():
         wb.save(excel_path)
-        logger.info(f"Excel file updated: {excel_path}")
+        return
     
-    except Exception as e:
-        logger.error(f"Error updating Excel: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
\ No newline at end of file
+    directory = os.path.dirname(os.path.abspath(excel_path))
+    fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=directory)
+    os.close(fd)
+    
+    try:
+        wb.save(tmp_path)
+        # mkstemp creates the file owner-only: keep the workbook's permissions
+        shutil.copymode(excel_path, tmp_path)
+        os.replace(tmp_path, excel_path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+def write_summary_sheets(wb, style_arrays, summary_sheets):
+    """Replace the summary sheets with freshly laid out ones"""
+    for sheet_name, headers, rows in summary_sheets:
+        if sheet_name in wb.sheetnames:
+            index = wb.sheetnames.index(sheet_name)
+            wb.remove(wb[sheet_name])
+            ws = wb.create_sheet(sheet_name, index)
+        else:
+            ws = wb.create_sheet(sheet_name)
+        
+        content_widths = {}
+        ws.append(styled_cells(ws, style_arrays, [(header, "header") for header in headers]))
+        update_content_widths(content_widths, headers)
+        
+        for values in rows:
+            ws.append(styled_cells(ws, style_arrays, [(value, "player") for value in values]))
+            update_content_widths(content_widths, values)
+        
+        apply_column_widths(ws, content_widths)
+        logger.debug(f"Wrote summary sheet {sheet_name} with {len(rows)} rows")
@@ -0,0 +1 @@
+"""Output sinks module"""
\ No newline at end of file
@@ -0,0 +1,69 @@
+import csv
+import logging
+from pathlib import Path
+from config import PAYLOAD_DIR
+from excel.store import load_store
+from riot.cache import PayloadStore
+from riot.models import Match
+from stats.positions import analyze_positions
+
+logger = logging.getLogger(__name__)
+
+# Tables written by analyze_positions, one CSV file each
+POSITION_TABLES = ["players", "jungle", "leads", "heatmaps"]
+
+# Context columns added in front of every row
+POSITION_CONTEXT_COLUMNS = ["day", "match", "code"]
+
+def get_positions_dir(excel_path):
+    """Get the directory of the positional analytics kept next to a workbook"""
+    return Path(excel_path).with_suffix(".positions")
+
+def export_positions(excel_path, output_dir=None, payload_dir=PAYLOAD_DIR):
+    """Analyze the positions of every match of a workbook's data store from its stored payloads
+
+    Writes one CSV file per table to output_dir (next to the workbook by
+    default), replacing previous files; rows are streamed match by match.
+    Returns the number of matches analyzed and the IDs of matches whose
+    payloads are not stored.
+    """
+    output_dir = Path(output_dir or get_positions_dir(excel_path))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    payloads = PayloadStore(payload_dir)
+
+    # Every entry of a match holds its context and a team's player names
+    matches = {}
+    for entry in load_store(excel_path):
+        match = matches.setdefault(entry["match_id"], {"context": entry, "names": {}})
+        for player in entry["team_stats"]:
+            if player.get("puuid"):
+                match["names"][player["puuid"]] = player["summonerName"]
+
+    files = {table: open(output_dir / f"{table}.csv", "w", newline="", encoding="utf-8")
+             for table in POSITION_TABLES}
+    writers = {}
+    analyzed = 0
+    missing = []
+    try:
+        for match_id, match in matches.items():
+            stored = payloads.load(match_id)
+            if not stored:
+                logger.warning(f"No stored payloads for {match_id}, skipping its positions")
+                missing.append(match_id)
+                continue
+
+            context = {column: match["context"].get(column) for column in POSITION_CONTEXT_COLUMNS}
+            for table, rows in analyze_positions(Match(*stored), match["names"]).items():
+                if not rows:
+                    continue
+                if table not in writers:
+                    writers[table] = csv.DictWriter(files[table], fieldnames=POSITION_CONTEXT_COLUMNS + list(rows[0]))
+                    writers[table].writeheader()
+                writers[table].writerows({**context, **row} for row in rows)
+            analyzed += 1
+    finally:
+        for f in files.values():
+            f.close()
+
+    logger.info(f"Wrote positional analytics of {analyzed} matches to {output_dir}")
+    return analyzed, missing
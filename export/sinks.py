@@ -0,0 +1,246 @@
+import csv
+import json
+import logging
+import os
+import shutil
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from stats.calculator import to_number
+from stats.registry import STATS
+from utils.profiler import stage
+
+logger = logging.getLogger(__name__)
+
+# Columns of every flat row before the registered stats, as (name, dtype)
+FLAT_CONTEXT_COLUMNS = [
+    ("day", "string"),
+    ("match", "string"),
+    ("code", "string"),
+    ("match_id", "string"),
+    ("team_id", "int"),
+    ("extractor_version", "int"),
+]
+
+def flat_schema():
+    """Get the (name, dtype) columns of flat rows: match context, then every registered stat"""
+    return FLAT_CONTEXT_COLUMNS + [(stat.key, stat.dtype) for stat in STATS]
+
+def _convert(value, dtype):
+    """Convert a stat value to its flat export type (None when it has no value)"""
+    if value is None:
+        return None
+    if dtype in ("int", "float"):
+        # Handles "N/A", percentages and "Perfect"
+        number = to_number(value)
+        if number is None:
+            return None
+        return int(number) if dtype == "int" else number
+    if dtype == "bool":
+        return bool(value)
+    return str(value)
+
+def flatten_match_stats(match_stats, schema=None):
+    """Turn match stats entries into flat rows, one per player and game"""
+    schema = schema or flat_schema()
+    rows = []
+    for entry in match_stats:
+        for player in entry["team_stats"]:
+            values = {**player, **{name: entry.get(name) for name, _ in FLAT_CONTEXT_COLUMNS}}
+            rows.append({name: _convert(values.get(name), dtype) for name, dtype in schema})
+    return rows
+
+class Sink(ABC):
+    """Destination of extracted match stats
+
+    write() gets the writer entries of a batch of codes (see
+    pipeline.ingest.extract_match_stats) and returns False if they could not
+    be written. Sinks are context managers; close() releases open files.
+    """
+
+    @abstractmethod
+    def write(self, match_stats):
+        """Write a batch of entries; returns False if they could not be written"""
+
+    def close(self):
+        pass
+
+    def __str__(self):
+        return str(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ExcelSink(Sink):
+    """Formatted workbook with day/match banners and summary sheets"""
+
+    def __init__(self, excel_path):
+        self.path = excel_path
+
+    def write(self, match_stats):
+        # Imported here so flat-only runs never load openpyxl
+        from excel.writer import update_excel_with_stats
+        with stage("excel", per_match=False):
+            return update_excel_with_stats(self.path, match_stats)
+
+class FlatSink(Sink):
+    """Append-only file of flat rows, streamed batch by batch"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.schema = flat_schema()
+
+    def write(self, match_stats):
+        with stage("export", per_match=False):
+            return self._write(match_stats)
+
+    def _write(self, match_stats):
+        rows = flatten_match_stats(match_stats, self.schema)
+        if not rows:
+            return True
+        try:
+            self.write_rows(rows)
+        except Exception as e:
+            logger.error(f"Error writing {len(rows)} rows to {self.path}: {str(e)}")
+            return False
+        logger.info(f"Wrote {len(rows)} rows to {self.path}")
+        return True
+
+    @abstractmethod
+    def write_rows(self, rows):
+        """Append flat rows to the file, raising if they could not be written"""
+
+class JsonlSink(FlatSink):
+    """JSON Lines file, one object per player and game"""
+
+    def write_rows(self, rows):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+class CsvSink(FlatSink):
+    """CSV file, one line per player and game
+
+    Files written by an earlier version keep their header: rows are laid
+    out in its columns, and new columns are left out.
+    """
+
+    def write_rows(self, rows):
+        columns = [name for name, _ in self.schema]
+        new_file = not self.path.exists() or self.path.stat().st_size == 0
+        if not new_file:
+            with open(self.path, newline="", encoding="utf-8") as f:
+                header = next(csv.reader(f), columns)
+            if header != columns:
+                logger.warning(f"{self.path} has different columns, writing rows in its columns")
+                columns = header
+
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+
+class ParquetSink(FlatSink):
+    """Directory of Parquet files, one file per run with one row group per batch
+
+    Needs pyarrow, which is only imported when a Parquet export is used.
+    """
+
+    ARROW_TYPES = {"string": "string", "int": "int64", "float": "float64", "bool": "bool_"}
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.writer = None
+
+    def write_rows(self, rows):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+        schema = pa.schema([(name, getattr(pa, self.ARROW_TYPES[dtype])()) for name, dtype in self.schema])
+        if self.writer is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            part_path = self.path / f"part-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}.parquet"
+            self.writer = pq.ParquetWriter(part_path, schema)
+            logger.info(f"Writing Parquet file {part_path}")
+
+        self.writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+class SinkGroup(Sink):
+    """Several sinks fed with the same batches, in one pass"""
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def write(self, match_stats):
+        # Stop at the first failure so the batch is retried everywhere later;
+        # the workbook goes first since it skips matches it already has
+        return all(sink.write(match_stats) for sink in self.sinks)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def __str__(self):
+        return ", ".join(str(sink) for sink in self.sinks)
+
+FLAT_SINKS = {
+    ".csv": CsvSink,
+    ".jsonl": JsonlSink,
+    ".parquet": ParquetSink,
+}
+
+def open_sinks(excel_path=None, export_paths=()):
+    """Open the sinks of a run: the workbook (if any) and flat exports chosen by file extension"""
+    sinks = [ExcelSink(excel_path)] if excel_path else []
+    for export_path in export_paths:
+        sink_class = FLAT_SINKS.get(Path(export_path).suffix.lower())
+        if sink_class is None:
+            raise ValueError(f"Unknown export format for {export_path} (use {', '.join(FLAT_SINKS)})")
+        sinks.append(sink_class(export_path))
+    return SinkGroup(sinks)
+
+def rewrite_exports(export_paths, match_stats):
+    """Replace flat exports with files holding exactly the given entries
+
+    Each export is written next to the old one and swapped in once it is
+    complete, so a failed rewrite leaves the old file in place. Returns
+    False if any export could not be rewritten.
+    """
+    rewritten = True
+    for export_path in export_paths:
+        path = Path(export_path)
+        sink_class = FLAT_SINKS.get(path.suffix.lower())
+        if sink_class is None:
+            raise ValueError(f"Unknown export format for {export_path} (use {', '.join(FLAT_SINKS)})")
+
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        if tmp_path.is_dir():
+            shutil.rmtree(tmp_path)
+        elif tmp_path.exists():
+            tmp_path.unlink()
+
+        with sink_class(tmp_path) as sink:
+            written = sink.write(match_stats)
+        if not written or not tmp_path.exists():
+            logger.error(f"Could not rewrite {path}, leaving it as it was")
+            rewritten = False
+            continue
+
+        # Parquet exports are directories, which os.replace cannot overwrite
+        if path.is_dir():
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+        logger.info(f"Rewrote {path} from {len(match_stats)} entries")
+    return rewritten
@@ -1,38 +1,228 @@
+import argparse
+import importlib.util
 import logging
+import os
 import sys
-from datetime import datetime
-from pathlib import Path
-import time
 
-from config import API_KEY, DEFAULT_EXCEL_PATH
-from riot.api import RiotAPI
-from stats.extractor import extract_team_stats
-from excel.writer import update_excel_with_stats
-from utils.logger import setup_logging
-from utils.helpers import parse_tournament_code, is_match_id
+import config
+from config import JOURNAL_FILE, WRITE_BATCH_SIZE, CALLBACK_HOST, JOB_QUEUE_FILE
 
-def main():
-    # Setup logging
-    logger = setup_logging()
-    logger.info("=== Starting LoL Tournament Stats ===")
+# Heavy modules (requests, openpyxl, dotenv, asyncio) are imported by the code
+# paths that need them, so fast commands like --help, validate-codes and
+# status start without loading them.
+
+def export_path(path):
+    """Check that an --export path has a known flat format whose dependencies are installed"""
+    from export.sinks import FLAT_SINKS
     
-    # Check if API key is set
-    if not API_KEY:
-        logger.error("Error: RIOT_API_KEY not found in .env file")
-        print("Error: RIOT_API_KEY not found in .env file")
+    if os.path.splitext(path)[1].lower() not in FLAT_SINKS:
+        raise argparse.ArgumentTypeError(f"unknown export format for {path} (use {', '.join(FLAT_SINKS)})")
+    
+    # Fail before any match is fetched rather than at the first write
+    if os.path.splitext(path)[1].lower() == ".parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise argparse.ArgumentTypeError(f"Parquet export to {path} needs pyarrow (pip install pyarrow)")
+    return path
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Collect LoL tournament stats into an Excel file")
+    parser.add_argument("--rebuild", metavar="EXCEL_PATH",
+                        help="rebuild a workbook from its local data store and exit")
+    parser.add_argument("--recompute", metavar="EXCEL_PATH",
+                        help="re-derive stats written by older extractor versions from stored payloads, "
+                             "rebuild the workbook (and rewrite any --export files) and exit")
+    parser.add_argument("--positions", metavar="EXCEL_PATH",
+                        help="write positional analytics (heatmaps, lane presence, roaming, jungle paths, "
+                             "lead curves) of a workbook's matches to CSV files and exit")
+    parser.add_argument("--resume", action="store_true",
+                        help="resume the last interrupted run from its journal")
+    parser.add_argument("--journal", default=JOURNAL_FILE,
+                        help=f"run journal file (default: {JOURNAL_FILE})")
+    parser.add_argument("--batch-size", type=int, default=WRITE_BATCH_SIZE,
+                        help=f"codes to extract before writing a batch (default: {WRITE_BATCH_SIZE})")
+    parser.add_argument("--listen", metavar="[HOST:]PORT",
+                        help="receive tournament game-completion callbacks instead of asking for codes")
+    parser.add_argument("--excel", metavar="EXCEL_PATH",
+                        help="Excel file to update when listening for callbacks or writing queued jobs")
+    parser.add_argument("--export", metavar="PATH", action="append", default=[], type=export_path,
+                        help="also stream rows to a flat .csv, .jsonl or .parquet export (repeatable)")
+    parser.add_argument("--no-excel", action="store_true",
+                        help="write the --export files only, without an Excel file")
+    parser.add_argument("--profile", nargs="?", const="", metavar="RUN_DIR",
+                        help="profile each pipeline stage with cProfile and tracemalloc, writing reports to "
+                             "RUN_DIR (default: a new directory in profiles/)")
+    parser.add_argument("--profile-every", type=int, default=1, metavar="N",
+                        help="profile the per-match stages of every Nth match only (default: 1)")
+    parser.add_argument("--queue", default=JOB_QUEUE_FILE,
+                        help=f"job queue database shared by workers (default: {JOB_QUEUE_FILE})")
+    
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    validate_parser = subparsers.add_parser("validate-codes", help="check codes offline, without calling the API")
+    validate_parser.add_argument("codes", nargs="+", metavar="CODE", help="tournament codes or match IDs")
+    subparsers.add_parser("status", help="show the progress of the last run from its journal")
+    
+    queue_parser = subparsers.add_parser("queue", help="split ingest between worker processes through a job queue")
+    queue_subparsers = queue_parser.add_subparsers(dest="queue_command", metavar="ACTION", required=True)
+    add_parser = queue_subparsers.add_parser("add", help="queue tournament codes or match IDs")
+    add_parser.add_argument("codes", nargs="+", metavar="CODE", help="tournament codes or match IDs")
+    add_parser.add_argument("--day", help="day number of codes that don't include one")
+    add_parser.add_argument("--match", help="match number of codes that don't include one")
+    work_parser = queue_subparsers.add_parser("work", help="fetch and extract queued jobs")
+    work_parser.add_argument("--processes", type=int, default=1, help="worker processes to run (default: 1)")
+    write_parser = queue_subparsers.add_parser("write", help="write extracted jobs to --excel and/or --export files")
+    write_parser.add_argument("--follow", action="store_true", help="keep waiting for new jobs")
+    queue_subparsers.add_parser("status", help="show the progress of the queued jobs")
+    return parser.parse_args()
+
+def validate_codes(codes):
+    """Check tournament codes and match IDs offline; returns the number of problems found"""
+    from utils.helpers import get_region_from_code, is_match_id, parse_tournament_code
+    
+    problems = 0
+    seen = set()
+    for code in codes:
+        region = get_region_from_code(code) or "default region"
+        if is_match_id(code):
+            details = f"match ID, {region}"
+        else:
+            parsed_code = parse_tournament_code(code, interactive=False, default_day=None, default_match=None)
+            details = f"tournament code, {region}, day {parsed_code['day'] or '?'}, match {parsed_code['match'] or '?'}"
+        
+        if code in seen:
+            details += " (duplicate)"
+            problems += 1
+        seen.add(code)
+        print(f"{code}: {details}")
+    
+    return problems
+
+def show_status(journal_path):
+    """Print the progress of the last run recorded in the journal"""
+    from utils.journal import RunJournal, CODE_STATES
+    
+    journal = RunJournal(journal_path).load()
+    if not journal.run:
+        print(f"No run recorded in {journal_path}")
         return
     
-    logger.info(f"Using API key: {API_KEY[:5]}... (truncated)")
+    codes = journal.run["codes"]
+    print(f"Excel file: {journal.run['excel_path'] or 'none'}")
+    if journal.run.get("exports"):
+        print(f"Exports: {', '.join(journal.run['exports'])}")
+    print(f"Codes: {len(codes)}")
+    for state in [None] + CODE_STATES:
+        count = sum(1 for code in codes if journal.state(code) == state)
+        if count:
+            print(f"  {state or 'not started'}: {count}")
     
-    # Initialize Riot API client
-    riot_api = RiotAPI()
+    pending = journal.pending_codes()
+    if pending:
+        print(f"Pending (rerun with --resume): {', '.join(pending)}")
+
+def show_queue_status(queue):
+    """Print job counts and failed jobs of a job queue"""
+    counts = queue.counts()
+    print(f"Jobs in {queue.path}:")
+    for state in ["queued", "resolved", "fetched", "extracted", "written", "leased", "failed"]:
+        print(f"  {state}: {counts.get(state, 0)}")
+    for code, error in queue.failed_jobs():
+        print(f"Failed: {code} ({error})")
+
+def run_queue_command(args):
+    """Run a job queue action; returns the exit code"""
+    from export.sinks import open_sinks
+    from pipeline.queue import SQLiteJobQueue
+    from pipeline import worker
     
-    # Ask for Excel file path
-    excel_path = input("Enter the path to the Excel file (leave blank for a new file): ").strip()
-    if not excel_path:
-        excel_path = DEFAULT_EXCEL_PATH
+    queue = SQLiteJobQueue(args.queue)
     
-    logger.info(f"Excel file path: {excel_path}")
+    if args.queue_command == "add":
+        print(f"Queued {queue.add(args.codes, args.day, args.match)} new codes in {args.queue}")
+    elif args.queue_command == "status":
+        show_queue_status(queue)
+    elif args.queue_command == "work":
+        if not config.API_KEYS:
+            print("Error: RIOT_API_KEY not found in .env file")
+            return 1
+        if not worker.start_workers(args.queue, max(1, args.processes)):
+            return 1
+        show_queue_status(queue)
+    elif args.queue_command == "write":
+        excel_path = None if args.no_excel else args.excel
+        if not excel_path and not args.export:
+            print("Error: give the Excel file to write with --excel and/or exports with --export")
+            return 1
+        with open_sinks(excel_path, args.export) as sink:
+            if not worker.run_writer(queue, sink, args.batch_size, args.follow):
+                print("Could not write the queued jobs. Check the log file")
+                return 1
+        print(f"Stats written to: {sink}")
+    return 0
+
+def recompute_workbook(excel_path, exports=()):
+    """Recompute a workbook's outdated stats and rebuild it and any exports from the updated store
+    
+    Exports are rewritten rather than appended to, so they hold each
+    match's recomputed rows only.
+    """
+    from excel.store import load_store
+    from excel.writer import matches_missing_from_store, rebuild_excel_from_store
+    from export.sinks import rewrite_exports
+    from pipeline.recompute import recompute_store
+    from stats.extractor import EXTRACTOR_VERSION
+    
+    # The workbook is rebuilt from the store, which must hold every one of its matches
+    not_stored = matches_missing_from_store(excel_path)
+    if not_stored:
+        print(f"{len(not_stored)} matches of {excel_path} are not in its local data store "
+              f"(written before the store existed?), not recomputing")
+        return 1
+    
+    recomputed, missing = recompute_store(excel_path)
+    if recomputed:
+        if not rebuild_excel_from_store(excel_path):
+            print("Could not rebuild the workbook. Check the log file")
+            return 1
+        if exports and not rewrite_exports(exports, load_store(excel_path)):
+            print("Could not rewrite every export, see the log")
+    
+    match_ids = {entry["match_id"] for entry in recomputed}
+    print(f"Recomputed {len(match_ids)} matches to extractor version {EXTRACTOR_VERSION}: {excel_path}")
+    if missing:
+        print(f"No stored payloads for {len(missing)} matches, left as they were: {', '.join(missing)}")
+
+def listen_for_callbacks(riot_api, journal, payloads, identities, listen, excel_path=None, exports=(),
+                         no_excel=False):
+    """Run the callback receiver, continuing the journal's run for the same workbook and exports"""
+    import asyncio
+    from export.sinks import open_sinks
+    from pipeline.receiver import CallbackReceiver
+    
+    host, _, port = listen.rpartition(":")
+    
+    journal.load()
+    run = journal.run or {}
+    if no_excel:
+        excel_path = None
+    else:
+        excel_path = excel_path or run.get("excel_path") or config.DEFAULT_EXCEL_PATH
+    exports = list(exports) or run.get("exports", [])
+    if not journal.run or run["excel_path"] != excel_path or run.get("exports", []) != exports:
+        journal.start(excel_path, [], exports)
+    
+    logging.getLogger().info(f"Excel file path: {excel_path}")
+    with open_sinks(excel_path, exports) as sink:
+        receiver = CallbackReceiver(riot_api, sink, journal, payloads, identities)
+        asyncio.run(receiver.serve(host or CALLBACK_HOST, int(port)))
+
+def ask_for_run(ask_excel=True):
+    """Ask the user for the Excel file path (unless there is none) and the codes to process"""
+    # Ask for Excel file path
+    excel_path = None
+    if ask_excel:
+        excel_path = input("Enter the path to the Excel file (leave blank for a new file): ").strip()
+        if not excel_path:
+            excel_path = config.DEFAULT_EXCEL_PATH
     
     # Get tournament codes or match IDs from user
     print("Enter tournament codes or match IDs (one per line, leave blank to finish):")
@@ -43,144 +233,192 @@ def main():
             break
         codes.append(code)
     
-    if not codes:
-        logger.error("No codes provided. Exiting.")
-        print("No codes provided. Exiting.")
-        return
+    return excel_path, codes
+
+def flush_stats(sink, codes, match_stats, journal):
+    """Write a batch of extracted stats to the run's sinks and mark its codes as written"""
+    logger = logging.getLogger()
     
-    logger.info(f"Processing {len(codes)} codes: {codes}")
-    print(f"Processing {len(codes)} codes...")
+    if match_stats:
+        logger.info(f"Writing {len(match_stats)} match stats for {len(codes)} codes")
+        if not sink.write(match_stats):
+            return False
+        print(f"Stats written to: {sink}")
+    
+    for code in codes:
+        journal.record(code, "written")
+    return True
+
+def process_codes(riot_api, codes, journal, payloads, identities, sink, batch_size):
+    """Ingest codes, writing their stats to the sink every batch; returns the number of match stats (None on failure)"""
+    from pipeline.ingest import ingest_code
     
-    # Process each code
-    all_match_stats = []
+    logger = logging.getLogger()
+    batch_codes = []
+    batch_stats = []
+    total_stats = 0
     
     for code in codes:
         logger.info(f"Processing code: {code}")
         print(f"Processing code: {code}")
         
-        # Check if this is a match ID rather than a tournament code
-        if is_match_id(code):
-            # Direct match ID
-            match_id = code
-            day = input(f"Enter day number for match {match_id}: ").strip() or "1"
-            match_num = input(f"Enter match number for match {match_id}: ").strip() or "1"
-            
-            logger.info(f"Using direct match ID: {match_id} (Day {day}, Match {match_num})")
-            
-            # Get match data
-            match_data = riot_api.get_match_data(match_id)
-            if not match_data:
-                logger.error(f"Could not get match data for {match_id}")
-                print(f"Could not get match data for {match_id}")
-                continue
-            
-            # Get timeline data
-            timeline_data = riot_api.get_match_timeline(match_id)
-            if not timeline_data:
-                logger.error(f"Could not get timeline data for {match_id}")
-                print(f"Could not get timeline data for {match_id}")
-                continue
-            
-        else:
-            # Tournament code
-            tournament_code = code
-            parsed_code = parse_tournament_code(tournament_code)
-            day = parsed_code["day"]
-            match_num = parsed_code["match"]
-            
-            logger.info(f"Using tournament code: {tournament_code} (Day {day}, Match {match_num})")
-            
-            # Try to get match ID from tournament code
-            match_ids = riot_api.get_match_by_tournament_code(tournament_code)
-            
-            if not match_ids:
-                logger.warning(f"No match found for tournament code {tournament_code}")
-                print(f"No match found for tournament code {tournament_code}")
-                
-                # Ask if user wants to provide a match ID directly
-                use_direct = input("Would you like to provide a match ID directly for this tournament code? (y/n): ").strip().lower()
-                if use_direct == 'y':
-                    match_id = input("Enter match ID (e.g. EUW1_12345678): ").strip()
-                    if not match_id:
-                        continue
-                    
-                    logger.info(f"Using manually entered match ID: {match_id}")
-                    
-                    # Get match data directly
-                    match_data = riot_api.get_match_data(match_id)
-                    timeline_data = riot_api.get_match_timeline(match_id)
-                else:
-                    continue
-            else:
-                # Use the first match from the tournament code
-                match_id = match_ids[0]
-                logger.info(f"Found match ID: {match_id}")
-                
-                # Try to get tournament-specific match data
-                match_data = riot_api.get_match_data_for_tournament(match_id, tournament_code)
-                
-                # Fallback to regular match data if tournament API fails
-                if not match_data:
-                    logger.info("Tournament match data not available, trying regular match data...")
-                    match_data = riot_api.get_match_data(match_id)
-                
-                # Get timeline data
-                timeline_data = riot_api.get_match_timeline(match_id)
+        match_stats = ingest_code(riot_api, code, journal, payloads, identities=identities)
         
-        # Check if we have both match and timeline data
-        if not match_data or not timeline_data:
-            logger.error(f"Missing required data for match {match_id}")
-            print(f"Missing required data for match {match_id}")
-            continue
+        if match_stats is not None:
+            batch_codes.append(code)
+            batch_stats.extend(match_stats)
+            total_stats += len(match_stats)
         
-        logger.info("Successfully retrieved match and timeline data")
+        if len(batch_codes) >= batch_size:
+            if not flush_stats(sink, batch_codes, batch_stats, journal):
+                return None
+            batch_codes = []
+            batch_stats = []
+    
+    if not flush_stats(sink, batch_codes, batch_stats, journal):
+        return None
+    return total_stats
+
+def run(args):
+    """Run the command given on the command line"""
+    logger = logging.getLogger()
+    
+    if args.command == "queue":
+        return run_queue_command(args)
+    
+    if args.rebuild:
+        from excel.writer import rebuild_excel_from_store
+        if not rebuild_excel_from_store(args.rebuild):
+            print("Could not rebuild the workbook. Check the log file")
+            return 1
+        print(f"Excel file rebuilt: {args.rebuild}")
+        return
+    
+    if args.recompute:
+        return recompute_workbook(args.recompute, args.export)
+    
+    if args.positions:
+        from export.positions import export_positions, get_positions_dir
+        analyzed, missing = export_positions(args.positions)
+        print(f"Positional analytics of {analyzed} matches written to {get_positions_dir(args.positions)}")
+        if missing:
+            print(f"No stored payloads for {len(missing)} matches: {', '.join(missing)}")
+        return
+    
+    from riot.api import RiotAPI
+    from riot.cache import PayloadStore
+    from riot.identity import PlayerIdentities
+    from export.sinks import open_sinks
+    from utils.journal import RunJournal
+    
+    # Check if API key is set
+    if not config.API_KEYS:
+        logger.error("Error: RIOT_API_KEY not found in .env file")
+        print("Error: RIOT_API_KEY not found in .env file")
+        return
+    
+    logger.info(f"Using {len(config.API_KEYS)} API keys: {', '.join(key[:5] + '...' for key in config.API_KEYS)} (truncated)")
+    
+    # Initialize Riot API client
+    riot_api = RiotAPI()
+    payloads = PayloadStore()
+    identities = PlayerIdentities()
+    journal = RunJournal(args.journal)
+    
+    if args.listen:
+        listen_for_callbacks(riot_api, journal, payloads, identities, args.listen, args.excel, args.export,
+                             args.no_excel)
+        return
+    
+    if args.resume:
+        journal.load()
+        if not journal.run:
+            logger.error(f"No run to resume in {args.journal}")
+            print(f"No run to resume in {args.journal}")
+            return
         
-        # Get team IDs
-        team_ids = []
-        for p in match_data["info"]["participants"]:
-            if p["teamId"] not in team_ids:
-                team_ids.append(p["teamId"])
+        excel_path = journal.run["excel_path"]
+        exports = journal.run.get("exports", [])
+        codes = journal.pending_codes()
+        if not codes:
+            logger.info("Every code of the last run was already written")
+            print("Nothing to resume: every code of the last run was already written.")
+            return
         
-        logger.info(f"Found team IDs: {team_ids}")
+        logger.info(f"Resuming run with {len(codes)} pending codes")
+        print(f"Resuming run: {len(codes)} codes left")
+    else:
+        excel_path, codes = ask_for_run(ask_excel=not args.no_excel)
+        exports = args.export
         
-        # Extract stats for each team
-        for team_id in team_ids:
-            team_stats = extract_team_stats(match_data, timeline_data, team_id)
-            
-            if team_stats:
-                all_match_stats.append({
-                    "day": day,
-                    "match": match_num,
-                    "code": code,
-                    "match_id": match_id,
-                    "team_id": team_id,
-                    "team_stats": team_stats
-                })
-                logger.info(f"Added stats for team ID {team_id} with {len(team_stats)} players")
-            else:
-                logger.warning(f"No stats extracted for team ID {team_id}")
+        if not codes:
+            logger.error("No codes provided. Exiting.")
+            print("No codes provided. Exiting.")
+            return
         
-        # Rate limiting
-        time.sleep(1.2)
+        journal.start(excel_path, codes, exports)
     
-    # Check if we collected any stats
-    if not all_match_stats:
-        logger.error("No match stats collected. Nothing to write to Excel.")
-        print("No match stats collected. Nothing to write to Excel.")
+    logger.info(f"Excel file path: {excel_path}")
+    if exports:
+        logger.info(f"Export paths: {', '.join(exports)}")
+    logger.info(f"Processing {len(codes)} codes: {codes}")
+    print(f"Processing {len(codes)} codes...")
+    
+    # Process each code, writing stats to Excel and the exports every batch
+    with open_sinks(excel_path, exports) as sink:
+        total_stats = process_codes(riot_api, codes, journal, payloads, identities, sink, args.batch_size)
+    
+    if total_stats is None:
+        print("Could not write the stats. Check the log file, then rerun with --resume")
         return
     
-    logger.info(f"Total match stats collected: {len(all_match_stats)}")
+    # Check if we collected any stats
+    if not total_stats:
+        logger.error("No match stats collected. Nothing to write.")
+        print("No match stats collected. Nothing to write.")
+        return
     
-    # Update Excel file with stats
-    update_excel_with_stats(excel_path, all_match_stats)
-    print(f"Excel file updated: {excel_path}")
+    logger.info(f"Total match stats collected: {total_stats}")
     logger.info("=== LoL Tournament Stats completed successfully ===")
 
+def main():
+    args = parse_args()
+    
+    if args.no_excel and not args.export:
+        print("Error: --no-excel needs at least one --export file")
+        return 1
+    
+    if args.command == "validate-codes":
+        return 1 if validate_codes(args.codes) else 0
+    if args.command == "status":
+        show_status(args.journal)
+        return 0
+    
+    from utils.logger import setup_logging
+    
+    # Setup logging
+    logger = setup_logging()
+    logger.info("=== Starting LoL Tournament Stats ===")
+    
+    if args.profile is None:
+        return run(args)
+    
+    from utils.profiler import start_profiling, stop_profiling
+    
+    profiler = start_profiling(args.profile or None, args.profile_every)
+    try:
+        return run(args)
+    finally:
+        print(f"Profiling reports written to {profiler.directory}:")
+        print(stop_profiling())
+
 if __name__ == "__main__":
     try:
-        main()
+        exit_code = main()
+        if exit_code:
+            sys.exit(exit_code)
     except KeyboardInterrupt:
-        print("\nOperation cancelled by user")
+        print("\nOperation cancelled by user (rerun with --resume to continue)")
         logging.getLogger().info("Operation cancelled by user")
     except Exception as e:
         print(f"\nAn error occurred: {str(e)}")
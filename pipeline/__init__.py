@@ -0,0 +1 @@
+"""Match ingestion pipeline: resolving codes, fetching and extracting stats"""
\ No newline at end of file
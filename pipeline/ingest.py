@@ -0,0 +1,171 @@
+import logging
+from riot.models import Match
+from stats.extractor import EXTRACTOR_VERSION, extract_players_stats, extract_team_stats
+from utils.helpers import parse_tournament_code, is_match_id
+from utils.profiler import next_match, stage
+
+logger = logging.getLogger(__name__)
+
+def resolve_code(riot_api, code, interactive=True, day=None, match_num=None):
+    """Resolve a tournament code or match ID to its match ID and day/match numbers
+
+    Day and match numbers that are not part of the code are asked to the
+    user, or taken from the given values when running non-interactively.
+    Returns None if no match could be found for the code.
+    """
+    default_day = day or "1"
+    default_match = match_num or "1"
+    
+    # Check if this is a match ID rather than a tournament code
+    if is_match_id(code):
+        # Direct match ID
+        match_id = code
+        if interactive:
+            day = input(f"Enter day number for match {match_id}: ").strip() or default_day
+            match_num = input(f"Enter match number for match {match_id}: ").strip() or default_match
+        else:
+            day, match_num = default_day, default_match
+        
+        logger.info(f"Using direct match ID: {match_id} (Day {day}, Match {match_num})")
+        return {"match_id": match_id, "tournament_code": None, "day": day, "match": match_num}
+    
+    # Tournament code
+    tournament_code = code
+    parsed_code = parse_tournament_code(tournament_code, interactive, default_day, default_match)
+    day = parsed_code["day"]
+    match_num = parsed_code["match"]
+    
+    logger.info(f"Using tournament code: {tournament_code} (Day {day}, Match {match_num})")
+    
+    # Try to get match ID from tournament code
+    match_ids = riot_api.get_match_by_tournament_code(tournament_code)
+    
+    if match_ids:
+        # Use the first match from the tournament code
+        match_id = match_ids[0]
+        logger.info(f"Found match ID: {match_id}")
+        return {"match_id": match_id, "tournament_code": tournament_code, "day": day, "match": match_num}
+    
+    logger.warning(f"No match found for tournament code {tournament_code}")
+    if not interactive:
+        return None
+    print(f"No match found for tournament code {tournament_code}")
+    
+    # Ask if user wants to provide a match ID directly
+    use_direct = input("Would you like to provide a match ID directly for this tournament code? (y/n): ").strip().lower()
+    if use_direct != 'y':
+        return None
+    
+    match_id = input("Enter match ID (e.g. EUW1_12345678): ").strip()
+    if not match_id:
+        return None
+    
+    logger.info(f"Using manually entered match ID: {match_id}")
+    return {"match_id": match_id, "tournament_code": None, "day": day, "match": match_num}
+
+def fetch_match(riot_api, match_id, tournament_code=None):
+    """Fetch a match's data and timeline, as (match_data, timeline_data)
+
+    Either payload is None if it could not be retrieved.
+    """
+    match_data = None
+    if tournament_code:
+        # Try to get tournament-specific match data
+        match_data = riot_api.get_match_data_for_tournament(match_id, tournament_code)
+        
+        # Fallback to regular match data if tournament API fails
+        if not match_data:
+            logger.info("Tournament match data not available, trying regular match data...")
+    
+    if not match_data:
+        match_data = riot_api.get_match_data(match_id)
+        if not match_data:
+            logger.error(f"Could not get match data for {match_id}")
+            return None, None
+    
+    # Get timeline data
+    timeline_data = riot_api.get_match_timeline(match_id)
+    if not timeline_data:
+        logger.error(f"Could not get timeline data for {match_id}")
+    
+    return match_data, timeline_data
+
+def extract_match_stats(match, code, match_id, day, match_num, names=None):
+    """Extract the stats of every team of a match as writer entries, tagged with the extractor version"""
+    team_ids = match.team_ids
+    logger.info(f"Found team IDs: {team_ids}")
+    
+    all_match_stats = []
+    
+    # Extract every player's stats in one pass, then split them by team
+    players_stats = extract_players_stats(match, names=names)
+    for team_id in team_ids:
+        team_stats = extract_team_stats(match, team_id, players_stats)
+        
+        if team_stats:
+            all_match_stats.append({
+                "day": day,
+                "match": match_num,
+                "code": code,
+                "match_id": match_id,
+                "team_id": team_id,
+                "extractor_version": EXTRACTOR_VERSION,
+                "team_stats": team_stats
+            })
+            logger.info(f"Added stats for team ID {team_id} with {len(team_stats)} players")
+        else:
+            logger.warning(f"No stats extracted for team ID {team_id}")
+    
+    return all_match_stats
+
+def ingest_code(riot_api, code, journal, payloads, interactive=True, identities=None):
+    """Take one code as far as extracted stats, resuming from its journal state
+
+    Every step is checkpointed in the journal and fetched payloads are kept
+    in the payload store, so nothing done before a crash is redone. Player
+    names are resolved through `identities` when given. Returns the
+    extracted match stats, or None if the code could not be processed.
+    """
+    next_match()
+    state = journal.state(code)
+    
+    if state in ("extracted", "written"):
+        return journal.get(code, "match_stats", [])
+    
+    if state in (None, "queued"):
+        resolved = resolve_code(riot_api, code, interactive, journal.get(code, "day"), journal.get(code, "match"))
+        if not resolved:
+            return None
+        journal.record(code, "resolved", **resolved)
+    
+    match_id = journal.get(code, "match_id")
+    with stage("payloads"):
+        stored = payloads.load(match_id) if journal.state(code) == "fetched" else None
+    
+    if stored:
+        match_data, timeline_data = stored
+        logger.info(f"Using stored payloads for {match_id}")
+    else:
+        match_data, timeline_data = fetch_match(riot_api, match_id, journal.get(code, "tournament_code"))
+        
+        # Check if we have both match and timeline data
+        if not match_data or not timeline_data:
+            logger.error(f"Missing required data for match {match_id}")
+            print(f"Missing required data for match {match_id}")
+            return None
+        
+        logger.info("Successfully retrieved match and timeline data")
+        with stage("payloads"):
+            payloads.save(match_id, match_data, timeline_data)
+        journal.record(code, "fetched")
+    
+    # Wrap the payloads once so derived views are shared by every stat
+    match = Match(match_data, timeline_data)
+    with stage("names"):
+        names = identities.resolve(riot_api, match) if identities else None
+    with stage("extract"):
+        all_match_stats = extract_match_stats(
+            match, code, match_id, journal.get(code, "day"), journal.get(code, "match"), names)
+    
+    journal.record(code, "extracted", match_stats=all_match_stats)
+    return all_match_stats
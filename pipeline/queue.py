@@ -0,0 +1,290 @@
+import json
+import logging
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from config import JOB_QUEUE_FILE, JOB_LEASE, JOB_MAX_ATTEMPTS, JOB_RETRY_DELAY
+
+logger = logging.getLogger(__name__)
+
+# SQL conditions on the jobs table
+UNFINISHED = "state NOT IN ('extracted', 'written')"
+LEASED = "lease_owner IS NOT NULL AND lease_until >= ?"
+
+class LeaseLost(Exception):
+    """Raised when a worker checkpoints a job whose lease it no longer holds"""
+
+class JobQueue(ABC):
+    """Durable queue of codes (tournament codes or match IDs) to ingest
+
+    A queue is also the journal of its jobs: it has the state/get/record
+    methods of RunJournal, so the ingest pipeline checkpoints every step
+    into it. Workers claim jobs with a lease that is renewed at each
+    checkpoint; a job whose worker died is claimed again once its lease
+    runs out and resumes from its last checkpoint. Extracted jobs are then
+    written to the workbook by a single writer, which holds a named lock.
+
+    Backends implement every abstract method below, or cannot be created.
+    """
+
+    @abstractmethod
+    def add(self, codes, day=None, match_num=None):
+        """Queue codes that are not queued yet; returns the number of codes added"""
+
+    @abstractmethod
+    def claim(self, worker):
+        """Lease the next job that needs work to a worker; returns its code or None"""
+
+    @abstractmethod
+    def release(self, code, worker, error=None):
+        """Give a job back after a failed attempt, to be retried after a delay"""
+
+    @abstractmethod
+    def state(self, code):
+        """Get the last state reached by a job (None if not started)"""
+
+    @abstractmethod
+    def get(self, code, key, default=None):
+        """Get data recorded for a job"""
+
+    @abstractmethod
+    def record(self, code, state, worker=None, **data):
+        """Checkpoint a job reaching a new state, renewing its lease
+
+        With a worker, the checkpoint is only recorded while that worker
+        holds the job's lease (LeaseLost is raised otherwise). A written
+        job never goes back to an earlier state.
+        """
+
+    @abstractmethod
+    def extracted_jobs(self, limit=None):
+        """Get (code, match stats) of the extracted jobs waiting to be written"""
+
+    @abstractmethod
+    def counts(self):
+        """Count jobs by state, plus "leased" and "failed" jobs"""
+
+    @abstractmethod
+    def claimable(self):
+        """Count jobs that still need a worker, leased or not"""
+
+    @abstractmethod
+    def failed_jobs(self):
+        """Get (code, last error) of the jobs that ran out of attempts"""
+
+    @abstractmethod
+    def acquire_lock(self, name, owner):
+        """Take or renew a named lock for one lease; returns False if someone else holds it"""
+
+    @abstractmethod
+    def release_lock(self, name, owner):
+        """Release a named lock held by owner"""
+
+    def journal_for(self, worker):
+        """Get a worker's journal of the jobs it holds, to pass to the ingest pipeline"""
+        return WorkerJournal(self, worker)
+
+class WorkerJournal:
+    """A worker's view of a job queue, with the state/get/record methods of RunJournal
+
+    Checkpoints are recorded on behalf of the worker, so a worker whose
+    lease ran out cannot overwrite the progress of the job's new owner.
+    """
+
+    def __init__(self, queue, worker):
+        self.queue = queue
+        self.worker = worker
+
+    def state(self, code):
+        return self.queue.state(code)
+
+    def get(self, code, key, default=None):
+        return self.queue.get(code, key, default)
+
+    def record(self, code, state, **data):
+        self.queue.record(code, state, worker=self.worker, **data)
+
+class SQLiteJobQueue(JobQueue):
+    """Job queue kept in a local SQLite database, shared by the worker processes"""
+
+    def __init__(self, path=JOB_QUEUE_FILE, lease=JOB_LEASE, max_attempts=JOB_MAX_ATTEMPTS,
+                 retry_delay=JOB_RETRY_DELAY):
+        self.path = str(path)
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._connection = None
+
+    @property
+    def connection(self):
+        # Opened on first use, so that every worker process gets its own connection
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    code TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    lease_owner TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    added REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS locks (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    lease_until REAL NOT NULL
+                );
+            """)
+        return self._connection
+
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so that two workers
+        # can never claim the same job
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def add(self, codes, day=None, match_num=None):
+        data = {key: value for key, value in (("day", day), ("match", match_num)) if value}
+        connection = self._transaction()
+        try:
+            added = 0
+            for code in dict.fromkeys(codes):
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO jobs (code, state, data, added) VALUES (?, 'queued', ?, ?)",
+                    (code, json.dumps(data), time.time()))
+                added += cursor.rowcount
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        logger.info(f"Queued {added} new codes")
+        return added
+
+    def claim(self, worker):
+        now = time.time()
+        connection = self._transaction()
+        try:
+            row = connection.execute(
+                f"SELECT code FROM jobs WHERE {UNFINISHED} AND attempts < ?"
+                " AND (lease_until IS NULL OR lease_until < ?) ORDER BY added LIMIT 1",
+                (self.max_attempts, now)).fetchone()
+            if row:
+                connection.execute(
+                    "UPDATE jobs SET lease_owner = ?, lease_until = ?, attempts = attempts + 1 WHERE code = ?",
+                    (worker, now + self.lease, row[0]))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        if row:
+            logger.debug(f"{worker} claimed {row[0]}")
+            return row[0]
+        return None
+
+    def release(self, code, worker, error=None):
+        # The job stays unclaimable until its retry delay has passed
+        self.connection.execute(
+            "UPDATE jobs SET lease_owner = NULL, error = ?,"
+            " lease_until = CASE WHEN attempts < ? THEN ? + ? * attempts END WHERE code = ? AND lease_owner = ?",
+            (error, self.max_attempts, time.time(), self.retry_delay, code, worker))
+
+    def _row(self, code):
+        return self.connection.execute("SELECT state, data FROM jobs WHERE code = ?", (code,)).fetchone()
+
+    def state(self, code):
+        row = self._row(code)
+        # Queued jobs have not been started, as in the run journal
+        return row[0] if row and row[0] != "queued" else None
+
+    def get(self, code, key, default=None):
+        row = self._row(code)
+        return json.loads(row[1]).get(key, default) if row else default
+
+    def record(self, code, state, worker=None, **data):
+        # Written jobs are final, and workers only checkpoint jobs they still hold
+        guard = "" if state == "written" else " AND state != 'written'"
+        guard_params = ()
+        if worker is not None:
+            guard += " AND lease_owner = ?"
+            guard_params = (worker,)
+
+        connection = self._transaction()
+        try:
+            row = connection.execute("SELECT data FROM jobs WHERE code = ?", (code,)).fetchone()
+            entry = json.loads(row[0]) if row else {}
+            entry.update(data)
+            if state in ("extracted", "written"):
+                # Done with the worker: free the job and clear errors of earlier attempts
+                cursor = connection.execute(
+                    "UPDATE jobs SET state = ?, data = ?, lease_owner = NULL, lease_until = NULL, error = NULL"
+                    f" WHERE code = ?{guard}", (state, json.dumps(entry), code) + guard_params)
+            else:
+                cursor = connection.execute(
+                    "UPDATE jobs SET state = ?, data = ?,"
+                    " lease_until = CASE WHEN lease_owner IS NULL THEN lease_until ELSE ? END"
+                    f" WHERE code = ?{guard}",
+                    (state, json.dumps(entry), time.time() + self.lease, code) + guard_params)
+            updated = cursor.rowcount
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        if not updated:
+            if worker is not None:
+                raise LeaseLost(f"{worker} no longer holds job {code}, not recording {state}")
+            logger.debug(f"Job {code} is already written, not recording {state}")
+            return
+        logger.debug(f"Job {code} -> {state}")
+
+    def extracted_jobs(self, limit=None):
+        rows = self.connection.execute(
+            "SELECT code, data FROM jobs WHERE state = 'extracted' ORDER BY added LIMIT ?",
+            (limit if limit else -1,)).fetchall()
+        return [(code, json.loads(data).get("match_stats", [])) for code, data in rows]
+
+    def counts(self):
+        now = time.time()
+        counts = dict(self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        counts["leased"] = self.connection.execute(
+            f"SELECT COUNT(*) FROM jobs WHERE {LEASED}", (now,)).fetchone()[0]
+        counts["failed"] = len(self.failed_jobs())
+        return counts
+
+    def claimable(self):
+        return self.connection.execute(
+            f"SELECT COUNT(*) FROM jobs WHERE {UNFINISHED} AND (attempts < ? OR ({LEASED}))",
+            (self.max_attempts, time.time())).fetchone()[0]
+
+    def failed_jobs(self):
+        return self.connection.execute(
+            f"SELECT code, error FROM jobs WHERE {UNFINISHED} AND attempts >= ? AND NOT ({LEASED}) ORDER BY added",
+            (self.max_attempts, time.time())).fetchall()
+
+    def acquire_lock(self, name, owner):
+        now = time.time()
+        connection = self._transaction()
+        try:
+            row = connection.execute("SELECT owner, lease_until FROM locks WHERE name = ?", (name,)).fetchone()
+            acquired = not row or row[0] == owner or row[1] < now
+            if acquired:
+                connection.execute("INSERT OR REPLACE INTO locks (name, owner, lease_until) VALUES (?, ?, ?)",
+                                   (name, owner, now + self.lease))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def release_lock(self, name, owner):
+        self.connection.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
+
+    def close(self):
+        """Close this process's connection to the database"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import sys
+import urllib.request
+from config import (CALLBACK_HOST, CALLBACK_PORT, CALLBACK_DEBOUNCE, CALLBACK_MAX_DELAY,
+                    CALLBACK_RETRY_DELAYS, CALLBACK_WRITE_RETRY_DELAYS)
+from pipeline.ingest import ingest_code
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 64 * 1024
+
+def parse_callback(body):
+    """Get the short code and day/match numbers from a game-completion callback
+
+    Day and match numbers are read from the callback's metaData when it is
+    a JSON object with "day" and/or "match" keys. Returns None if the body is
+    not a valid callback.
+    """
+    try:
+        payload = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+    if not isinstance(payload, dict) or not payload.get("shortCode"):
+        return None
+
+    day = match_num = None
+    try:
+        meta_data = json.loads(payload.get("metaData") or "{}")
+    except (json.JSONDecodeError, TypeError):
+        meta_data = {}
+    if isinstance(meta_data, dict):
+        day = str(meta_data["day"]) if "day" in meta_data else None
+        match_num = str(meta_data["match"]) if "match" in meta_data else None
+
+    return payload["shortCode"], day, match_num
+
+class CallbackReceiver:
+    """Local HTTP receiver for Riot tournament game-completion callbacks
+
+    Each callback is acknowledged right away and its short code queued. A
+    single worker runs the queued codes through the ingest pipeline and
+    writes them to the sink (the workbook and any flat exports) once no new
+    game has arrived for `debounce` seconds (or after `max_delay` seconds at
+    most), so a burst of games ending together costs one workbook update.
+    A batch that could not be written (e.g. the workbook is open in Excel)
+    is kept, with any games arriving meanwhile, and written again after
+    `write_retry_delays`.
+    """
+
+    def __init__(self, riot_api, sink, journal, payloads, identities=None, debounce=CALLBACK_DEBOUNCE,
+                 max_delay=CALLBACK_MAX_DELAY, retry_delays=CALLBACK_RETRY_DELAYS,
+                 write_retry_delays=CALLBACK_WRITE_RETRY_DELAYS):
+        self.riot_api = riot_api
+        self.sink = sink
+        self.journal = journal
+        self.payloads = payloads
+        self.identities = identities
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.retry_delays = retry_delays
+        self.write_retry_delays = write_retry_delays
+        self.queue = None
+        self.attempts = {}
+
+    def enqueue(self, code, day=None, match_num=None):
+        """Queue a code for processing, recording it in the journal"""
+        if self.journal.state(code) is None:
+            if code not in self.journal.run["codes"]:
+                self.journal.add_codes([code])
+            data = {key: value for key, value in (("day", day), ("match", match_num)) if value}
+            self.journal.record(code, "queued", **data)
+        self.queue.put_nowait(code)
+        logger.info(f"Queued code: {code}")
+
+    async def _respond(self, writer, status):
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        writer.close()
+
+    async def handle_connection(self, reader, writer):
+        """Handle a single HTTP request"""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")
+            method = request_line.split(" ")[0]
+
+            headers = {}
+            for line in header_lines:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+
+            if method != "POST":
+                await self._respond(writer, "405 Method Not Allowed")
+                return
+
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_SIZE:
+                await self._respond(writer, "413 Payload Too Large")
+                return
+
+            callback = parse_callback(await reader.readexactly(length))
+            if not callback:
+                logger.warning("Ignoring invalid tournament callback")
+                await self._respond(writer, "400 Bad Request")
+                return
+
+            await self._respond(writer, "200 OK")
+            self.enqueue(*callback)
+
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            logger.warning(f"Malformed callback request: {str(e)}")
+            writer.close()
+
+    def _retry_later(self, code):
+        """Requeue a code whose match is not available yet"""
+        attempt = self.attempts.get(code, 0)
+        if attempt >= len(self.retry_delays):
+            logger.error(f"Giving up on code {code} after {attempt} retries")
+            return
+
+        delay = self.retry_delays[attempt]
+        self.attempts[code] = attempt + 1
+        logger.info(f"Match for {code} not available yet, retrying in {delay}s")
+        asyncio.get_running_loop().call_later(delay, self.queue.put_nowait, code)
+
+    async def _flush(self, codes, match_stats):
+        """Write a micro-batch to the sink and mark its codes as written; returns False if it failed"""
+        if match_stats:
+            logger.info(f"Saving {len(match_stats)} match stats for {len(codes)} codes")
+            if not await asyncio.to_thread(self.sink.write, match_stats):
+                logger.error("Could not write the stats, codes stay pending in the journal")
+                return False
+        for code in codes:
+            self.journal.record(code, "written")
+        return True
+
+    async def process_queue(self):
+        """Process queued codes, writing them in debounced micro-batches"""
+        loop = asyncio.get_running_loop()
+        batch_codes = []
+        batch_stats = []
+        deadline = None
+        write_failures = 0
+
+        while True:
+            timeout = None if deadline is None else max(0, deadline - loop.time())
+            try:
+                code = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if await self._flush(batch_codes, batch_stats):
+                    batch_codes, batch_stats, deadline, write_failures = [], [], None, 0
+                else:
+                    # Keep the batch and write it again later, backing off
+                    delay = self.write_retry_delays[min(write_failures, len(self.write_retry_delays) - 1)]
+                    write_failures += 1
+                    logger.warning(f"Retrying to write {len(batch_codes)} codes in {delay}s")
+                    deadline = loop.time() + delay
+                continue
+
+            if self.journal.state(code) == "written" or code in batch_codes:
+                continue
+
+            try:
+                match_stats = await asyncio.to_thread(
+                    ingest_code, self.riot_api, code, self.journal, self.payloads, False, self.identities)
+            except Exception as e:
+                # An API outage must not stop the server: retry the code later
+                logger.error(f"Error processing code {code}: {str(e)}", exc_info=True)
+                match_stats = None
+
+            if match_stats is None:
+                self._retry_later(code)
+                continue
+
+            if not batch_codes:
+                first_arrival = loop.time()
+            batch_codes.append(code)
+            batch_stats.extend(match_stats)
+            # New games wait for the pending retry rather than bringing it forward
+            if not write_failures:
+                deadline = min(loop.time() + self.debounce, first_arrival + self.max_delay)
+
+    async def serve(self, host=CALLBACK_HOST, port=CALLBACK_PORT):
+        """Accept callbacks until cancelled, resuming codes left pending in the journal"""
+        self.queue = asyncio.Queue()
+        for code in self.journal.pending_codes():
+            self.queue.put_nowait(code)
+        if not self.queue.empty():
+            logger.info(f"Resuming {self.queue.qsize()} pending codes from the journal")
+
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logger.info(f"Listening for tournament callbacks on http://{host}:{port}/")
+        print(f"Listening for tournament callbacks on http://{host}:{port}/ (Ctrl-C to stop)")
+
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.process_queue())
+
+def post_callback(url, short_code, meta_data=None, game_id=0, region="EUW1"):
+    """Post a sample game-completion callback, as Riot's tournament API would"""
+    payload = {
+        "startTime": 0,
+        "shortCode": short_code,
+        "metaData": json.dumps(meta_data) if isinstance(meta_data, dict) else (meta_data or ""),
+        "gameId": game_id,
+        "gameName": "",
+        "gameType": "CUSTOM_GAME",
+        "gameMap": 11,
+        "gameMode": "CLASSIC",
+        "region": region,
+    }
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status
+
+if __name__ == "__main__":
+    # Local stand-in for Riot's callbacks: python -m pipeline.receiver URL CODE [CODE ...]
+    if len(sys.argv) < 3:
+        print("Usage: python -m pipeline.receiver URL CODE [CODE ...]")
+        sys.exit(1)
+    for short_code in sys.argv[2:]:
+        print(f"{short_code}: {post_callback(sys.argv[1], short_code)}")
@@ -0,0 +1,91 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from config import PAYLOAD_DIR, RECOMPUTE_PROCESSES
+from excel.store import load_store, replace_store
+from pipeline.ingest import extract_match_stats
+from riot.cache import PayloadStore
+from riot.models import Match
+from stats.extractor import EXTRACTOR_VERSION
+
+logger = logging.getLogger(__name__)
+
+def outdated_matches(match_stats, version=EXTRACTOR_VERSION):
+    """Group the entries extracted by an older extractor version by match ID
+
+    Entries stored before versions were recorded count as version 0.
+    """
+    matches = {}
+    for entry in match_stats:
+        if entry.get("extractor_version", 0) < version:
+            matches.setdefault(entry["match_id"], []).append(entry)
+    return matches
+
+def _recompute_match(task):
+    """Re-derive one match's entries from its stored payloads (None if they are not stored)"""
+    match_id, entries, payload_dir = task
+    stored = PayloadStore(payload_dir).load(match_id)
+    if not stored:
+        return None
+
+    # Keep the names already written rather than looking players up again
+    names = {player["puuid"]: player["summonerName"]
+             for entry in entries for player in entry["team_stats"] if player.get("puuid")}
+    first = entries[0]
+    return extract_match_stats(Match(*stored), first["code"], match_id, first["day"], first["match"], names)
+
+def recompute_stats(match_stats, payload_dir=PAYLOAD_DIR, processes=RECOMPUTE_PROCESSES):
+    """Re-derive the entries of older extractor versions from stored payloads, in parallel
+
+    Returns every entry (recomputed ones in place of the old ones), the
+    recomputed entries, and the IDs of the outdated matches whose payloads
+    are not stored (their entries are kept as they were).
+    """
+    matches = outdated_matches(match_stats)
+    if not matches:
+        return match_stats, [], []
+
+    processes = min(processes or os.cpu_count() or 1, len(matches))
+    logger.info(f"Recomputing {len(matches)} matches with {processes} processes")
+    tasks = [(match_id, entries, payload_dir) for match_id, entries in matches.items()]
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_recompute_match, tasks, chunksize=max(1, len(tasks) // (4 * processes))))
+    else:
+        results = [_recompute_match(task) for task in tasks]
+
+    recomputed = {}
+    missing = []
+    for match_id, result in zip(matches, results):
+        if result:
+            recomputed[match_id] = result
+        else:
+            logger.warning(f"No stored payloads for {match_id}, keeping its stats as they are")
+            missing.append(match_id)
+
+    # Each recomputed match takes the place of its first old entry
+    updated = []
+    placed = set()
+    for entry in match_stats:
+        match_id = entry["match_id"]
+        if match_id not in recomputed:
+            updated.append(entry)
+        elif match_id not in placed:
+            updated.extend(recomputed[match_id])
+            placed.add(match_id)
+    return updated, [entry for entries in recomputed.values() for entry in entries], missing
+
+def recompute_store(excel_path, payload_dir=PAYLOAD_DIR, processes=RECOMPUTE_PROCESSES):
+    """Bring a workbook's data store up to the current extractor version
+
+    Only the outdated entries are re-derived; the store is then rewritten
+    once. Returns the recomputed entries and the IDs of matches that could
+    not be recomputed.
+    """
+    match_stats = load_store(excel_path)
+    updated, recomputed, missing = recompute_stats(match_stats, payload_dir, processes)
+    if recomputed:
+        replace_store(excel_path, updated)
+    else:
+        logger.info(f"No entry of {excel_path} to recompute for extractor version {EXTRACTOR_VERSION}")
+    return recomputed, missing
@@ -0,0 +1,113 @@
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from config import JOB_POLL_INTERVAL, WRITE_BATCH_SIZE
+from pipeline.ingest import ingest_code
+from pipeline.queue import LeaseLost
+
+logger = logging.getLogger(__name__)
+
+WRITER_LOCK = "writer"
+
+def get_worker_id():
+    """Get a name for this process that is unique across machines"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def run_worker(queue, riot_api, payloads, identities=None, poll_interval=JOB_POLL_INTERVAL):
+    """Claim and ingest jobs until none is left to claim; returns the number of jobs extracted
+
+    While other workers still hold leases, this worker keeps polling so it
+    can take over their jobs if they die.
+    """
+    worker_id = get_worker_id()
+    journal = queue.journal_for(worker_id)
+    extracted = 0
+    logger.info(f"Worker {worker_id} started")
+
+    while True:
+        code = queue.claim(worker_id)
+        if code is None:
+            if not queue.claimable():
+                break
+            time.sleep(poll_interval)
+            continue
+
+        logger.info(f"Worker {worker_id} processing code: {code}")
+        try:
+            match_stats = ingest_code(riot_api, code, journal, payloads, interactive=False, identities=identities)
+        except LeaseLost as e:
+            # Another worker took the job over, leave it to them
+            logger.warning(str(e))
+            continue
+        except Exception as e:
+            logger.error(f"Error processing code {code}: {str(e)}", exc_info=True)
+            queue.release(code, worker_id, str(e))
+            continue
+
+        if match_stats is None:
+            queue.release(code, worker_id, "match not available")
+        else:
+            extracted += 1
+
+    logger.info(f"Worker {worker_id} done, {extracted} jobs extracted")
+    return extracted
+
+def run_writer(queue, sink, batch_size=WRITE_BATCH_SIZE, follow=False, poll_interval=JOB_POLL_INTERVAL):
+    """Write extracted jobs to a sink (see export.sinks), as the only writer of the queue
+
+    Stops once every job is written or failed, or keeps waiting for new
+    jobs with follow. Returns False if another writer is running or the
+    batch could not be written.
+    """
+    writer_id = get_worker_id()
+    if not queue.acquire_lock(WRITER_LOCK, writer_id):
+        logger.error("Another writer is already running for this queue")
+        return False
+
+    try:
+        while True:
+            jobs = queue.extracted_jobs(batch_size)
+            if jobs:
+                match_stats = [entry for _, job_stats in jobs for entry in job_stats]
+                logger.info(f"Writing {len(match_stats)} match stats for {len(jobs)} jobs")
+                if not sink.write(match_stats):
+                    return False
+                for code, _ in jobs:
+                    queue.record(code, "written")
+            elif not follow and not queue.claimable():
+                return True
+            else:
+                time.sleep(poll_interval)
+
+            # Renew the lock for the next batch
+            queue.acquire_lock(WRITER_LOCK, writer_id)
+    finally:
+        queue.release_lock(WRITER_LOCK, writer_id)
+
+def _worker_process(queue_path, rate_share):
+    # Each process opens its own logging, API client and database connection
+    from riot.api import RiotAPI
+    from riot.cache import PayloadStore
+    from riot.identity import PlayerIdentities
+    from pipeline.queue import SQLiteJobQueue
+    from utils.logger import setup_logging
+
+    setup_logging()
+    run_worker(SQLiteJobQueue(queue_path), RiotAPI(rate_share=rate_share), PayloadStore(), PlayerIdentities())
+
+def start_workers(queue_path, processes):
+    """Run worker processes on a SQLite queue until its jobs are extracted
+
+    The processes split the API keys' rate budgets evenly between them.
+    """
+    workers = [
+        multiprocessing.Process(target=_worker_process, args=(queue_path, 1 / processes), daemon=True)
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return all(worker.exitcode == 0 for worker in workers)
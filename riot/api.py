@@ -1,59 +1,161 @@
 import requests
 import logging
-import re
-from time import sleep
-from config import API_KEY, REGION_MAP, DEFAULT_REGION
+import threading
+from config import API_KEYS, API_MAX_RETRIES, DEFAULT_REGION
+from riot.keys import KeyPool, mask_key
+from utils.helpers import get_region_from_code
+from utils.profiler import stage
 
 logger = logging.getLogger(__name__)
 
+def _first_puuid(payload):
+    """Get the first participant PUUID of a match or timeline payload"""
+    participants = (payload.get("metadata") or {}).get("participants") or [None]
+    return participants[0]
+
+def _account_region(region):
+    """Get the regional route serving account requests for a region"""
+    # Accounts are global, but only served from these regions
+    if region not in ("americas", "asia", "europe"):
+        region = "asia" if region == "sea" else "americas"
+    return region
+
 class RiotAPI:
-    """Client for Riot Games API"""
+    """Client for Riot Games API
+
+    Requests are spread over a pool of API keys, each with its own rate
+    budget per region. Clients running in parallel processes should each
+    get a `rate_share` of the budgets (e.g. 1/4 for four processes).
+
+    Riot encrypts PUUIDs per application, so every pooled key must belong
+    to the same one or a player would get a different PUUID (and a
+    separate summary row) depending on the key that fetched the match. The
+    first configured key sets the application: every other key is checked
+    once, before its payloads are used, by having the first key decrypt a
+    PUUID it returned, and is taken out of the pool if it cannot.
+    """
     
-    def __init__(self, api_key=API_KEY, default_region=DEFAULT_REGION):
-        self.api_key = api_key
+    def __init__(self, api_keys=None, default_region=DEFAULT_REGION, rate_share=1):
+        if api_keys is None:
+            api_keys = API_KEYS
+        elif isinstance(api_keys, str):
+            api_keys = [api_keys]
+        self.key_pool = KeyPool(api_keys, share=rate_share)
         self.default_region = default_region
-        self.headers = {"X-Riot-Token": api_key}
+        self.same_application = set()
+        self._application_lock = threading.Lock()
     
     def get_region_from_code(self, code):
         """Extract region from tournament code or match ID"""
-        # For match IDs like EUW1_123456789
-        if "_" in code:
-            platform_id = code.split("_")[0]
-            platform_to_region = {
-                "EUW1": "europe",
-                "EUN1": "europe",
-                "NA1": "americas",
-                "KR": "asia",
-                "JP1": "asia",
-                "BR1": "americas",
-                "LA1": "americas",
-                "LA2": "americas",
-                "OC1": "sea",
-                "RU": "europe",
-                "TR1": "europe"
-            }
-            if platform_id in platform_to_region:
-                return platform_to_region[platform_id]
+        return get_region_from_code(code, self.default_region)
+    
+    def _get(self, url, region, scope="match", key=None):
+        """Send a GET request with the pooled key that has the most budget left in a region
+
+        Rejected keys (401/403) are taken out of rotation for the scope and
+        the request is sent again with another key; rate limited requests
+        (429) are retried once their key's Retry-After delay has passed.
+        With a key, the request is only sent with that key. Returns the last
+        response, or None if no key could be used.
+        """
+        response = None
+        retries = 0
+        requested_key = key
         
-        # For tournament codes like EUW12345
-        region_match = re.match(r'^([A-Z]{2,4})', code)
-        region_code = region_match.group(1).lower() if region_match else None
+        while retries <= API_MAX_RETRIES:
+            key = self.key_pool.acquire(region, scope, requested_key)
+            if key is None:
+                logger.error(f"No API key left for {scope} requests")
+                return response
+            
+            logger.debug(f"Requesting URL: {url}")
+            with stage("api"):
+                response = requests.get(url, headers={"X-Riot-Token": key})
+            
+            if "X-App-Rate-Limit" in response.headers:
+                self.key_pool.update_limits(key, region, response.headers["X-App-Rate-Limit"])
+            
+            if response.status_code in (401, 403):
+                self.key_pool.reject(key, scope)
+                continue
+            
+            if response.status_code == 429:
+                self.key_pool.block(key, region, int(response.headers.get("Retry-After", 1)))
+                retries += 1
+                continue
+            
+            return response
         
-        if region_code and region_code in REGION_MAP:
-            return REGION_MAP[region_code]
+        return response
+    
+    def _json(self, response):
+        """Decode a response's JSON body"""
+        with stage("decode"):
+            return response.json()
+    
+    def _check_application(self, key, puuid, region, decrypts=True):
+        """Check that a key belongs to the application of the first configured key
+
+        The first key decrypts a PUUID that `key` returned (or, with
+        decrypts=False, failed to decrypt) to compare their applications.
+        Returns False if the key belongs to another application, in which
+        case it is taken out of the pool.
+        """
+        primary = self.key_pool.keys[0]
+        if key == primary or key in self.same_application or not puuid:
+            return True
         
-        return self.default_region
+        with self._application_lock:
+            if key in self.same_application:
+                return True
+            
+            account_region = _account_region(region)
+            url = f"https://{account_region}.api.riotgames.com/riot/account/v1/accounts/by-puuid/{puuid}"
+            response = self._get(url, account_region, key=primary)
+            if response is None or response.status_code not in (200, 400):
+                logger.warning(f"Could not check the application of API key {mask_key(key)}, will check it again")
+                return True
+            if response.status_code == 400 and not decrypts:
+                # Neither key can decrypt the PUUID, which tells nothing about the key
+                return True
+            
+            if (response.status_code == 200) == decrypts:
+                self.same_application.add(key)
+                return True
+            
+            logger.error(f"API key {mask_key(key)} belongs to another application than {mask_key(primary)}, "
+                         f"so their PUUIDs differ (every key in RIOT_API_KEYS must belong to the same one)")
+            self.key_pool.retire(key)
+            return False
+    
+    def _get_payload(self, url, region, scope="match"):
+        """Get a payload holding PUUIDs, fetched with a key of the application already in use
+
+        Returns the last response and the decoded payload (None unless the
+        request succeeded).
+        """
+        while True:
+            response = self._get(url, region, scope)
+            if response is None or response.status_code != 200:
+                return response, None
+            
+            payload = self._json(response)
+            key = response.request.headers.get("X-Riot-Token")
+            if self._check_application(key, _first_puuid(payload), region):
+                return response, payload
+            # The key was taken out of the pool: fetch the payload again with another one
     
     def get_match_by_tournament_code(self, tournament_code):
         """Retrieve match ID for a tournament code"""
         region = self.get_region_from_code(tournament_code)
         url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/by-tournament-code/{tournament_code}"
         
-        logger.debug(f"Requesting URL: {url}")
-        response = requests.get(url, headers=self.headers)
+        response = self._get(url, region, scope="tournament")
+        if response is None:
+            return None
         
         if response.status_code == 200:
-            match_ids = response.json()
+            match_ids = self._json(response)
             logger.info(f"Successfully retrieved {len(match_ids)} match IDs")
             return match_ids
         else:
@@ -66,11 +168,11 @@ class RiotAPI:
         region = self.get_region_from_code(tournament_code)
         url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}/by-tournament-code/{tournament_code}"
         
-        logger.debug(f"Requesting URL: {url}")
-        response = requests.get(url, headers=self.headers)
+        response, match_data = self._get_payload(url, region, scope="tournament")
+        if response is None:
+            return None
         
         if response.status_code == 200:
-            match_data = response.json()
             logger.info(f"Successfully retrieved tournament match data for {match_id}")
             return match_data
         else:
@@ -83,11 +185,11 @@ class RiotAPI:
         region = self.get_region_from_code(match_id)
         url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}"
         
-        logger.debug(f"Requesting URL: {url}")
-        response = requests.get(url, headers=self.headers)
+        response, match_data = self._get_payload(url, region)
+        if response is None:
+            return None
         
         if response.status_code == 200:
-            match_data = response.json()
             logger.info(f"Successfully retrieved match data for {match_id}")
             return match_data
         else:
@@ -100,14 +202,36 @@ class RiotAPI:
         region = self.get_region_from_code(match_id)
         url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}/timeline"
         
-        logger.debug(f"Requesting URL: {url}")
-        response = requests.get(url, headers=self.headers)
+        response, timeline_data = self._get_payload(url, region)
+        if response is None:
+            return None
         
         if response.status_code == 200:
-            timeline_data = response.json()
             logger.info(f"Successfully retrieved match timeline for {match_id}")
             return timeline_data
         else:
             logger.error(f"Error getting match timeline: {response.status_code}")
             logger.error(f"Error response: {response.text}")
-            return None
\ No newline at end of file
+            return None
+    
+    def get_account_by_puuid(self, puuid, region=None):
+        """Get a player's account (gameName and tagLine) by PUUID"""
+        region = _account_region(region or self.default_region)
+        url = f"https://{region}.api.riotgames.com/riot/account/v1/accounts/by-puuid/{puuid}"
+        
+        while True:
+            response = self._get(url, region)
+            if response is None:
+                return None
+            # A key that cannot decrypt the PUUID may belong to another application: if so
+            # it is taken out of the pool, and the lookup is sent again with another key
+            key = response.request.headers.get("X-Riot-Token")
+            if response.status_code != 400 or self._check_application(key, puuid, region, decrypts=False):
+                break
+        
+        if response.status_code == 200:
+            return self._json(response)
+        else:
+            logger.error(f"Error getting account for PUUID {puuid}: {response.status_code}")
+            logger.error(f"Error response: {response.text}")
+            return None
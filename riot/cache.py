@@ -0,0 +1,48 @@
+import gzip
+import json
+import logging
+import os
+from pathlib import Path
+from config import PAYLOAD_DIR
+
+logger = logging.getLogger(__name__)
+
+class PayloadStore:
+    """Local store of raw match and timeline payloads, one gzipped JSON file per match"""
+    
+    def __init__(self, directory=PAYLOAD_DIR):
+        self.directory = Path(directory)
+    
+    def get_path(self, match_id):
+        """Get the file holding a match's payloads"""
+        return self.directory / f"{match_id}.json.gz"
+    
+    def __contains__(self, match_id):
+        return self.get_path(match_id).exists()
+    
+    def save(self, match_id, match_data, timeline_data):
+        """Save a match's payloads, replacing any previous copy atomically"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.get_path(match_id)
+        tmp_path = path.with_name(path.name + ".tmp")
+        
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"match": match_data, "timeline": timeline_data}, f)
+        os.replace(tmp_path, path)
+        
+        logger.debug(f"Saved payloads for {match_id} to {path}")
+    
+    def load(self, match_id):
+        """Load a match's payloads as (match_data, timeline_data), or None if not stored"""
+        path = self.get_path(match_id)
+        if not path.exists():
+            return None
+        
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                payloads = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not read stored payloads for {match_id}: {str(e)}")
+            return None
+        
+        return payloads["match"], payloads["timeline"]
@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from config import IDENTITY_CACHE_FILE, IDENTITY_TTL, IDENTITY_LOOKUP_THREADS
+
+logger = logging.getLogger(__name__)
+
+def format_riot_id(game_name, tagline):
+    """Format a Riot ID as gameName#tagLine (None without a game name)"""
+    if not game_name:
+        return None
+    return f"{game_name}#{tagline}" if tagline else game_name
+
+def participant_riot_id(participant):
+    """Get a participant's Riot ID from the match payload, if it has one"""
+    return format_riot_id(participant.get("riotIdGameName"),
+                          participant.get("riotIdTagline") or participant.get("riotIdTagLine"))
+
+class PlayerIdentities:
+    """Player names by PUUID, from match payloads first and account lookups when needed
+
+    Participants whose payload has a Riot ID are named from it. The others
+    are named from the cache, and those missing from it (or older than
+    `ttl` seconds) are looked up with the account API: all of a match's
+    missing players at once, concurrently. The cache is kept on disk and
+    always keeps the most recent name known for a PUUID.
+    """
+    
+    def __init__(self, path=IDENTITY_CACHE_FILE, ttl=IDENTITY_TTL, threads=IDENTITY_LOOKUP_THREADS):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.threads = threads
+        self._lock = threading.Lock()
+        self.names = self._load()
+    
+    def _load(self):
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            logger.warning(f"Unreadable player name cache {self.path}, starting a new one")
+            return {}
+    
+    def _remember(self, names, puuid, name, as_of):
+        """Keep a name unless a more recent one is already known"""
+        entry = names.get(puuid)
+        if entry is None or entry["as_of"] <= as_of:
+            names[puuid] = {"name": name, "as_of": as_of}
+    
+    def save(self):
+        """Atomically save the cache, merged with names saved by other processes"""
+        with self._lock:
+            names = self._load()
+            for puuid, entry in self.names.items():
+                self._remember(names, puuid, entry["name"], entry["as_of"])
+            self.names = names
+            
+            tmp_path = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(names, f)
+            os.replace(tmp_path, self.path)
+    
+    def get(self, puuid):
+        """Get the most recent name known for a PUUID"""
+        entry = self.names.get(puuid)
+        return entry["name"] if entry else None
+    
+    def learn_from_match(self, match):
+        """Remember the Riot IDs of a match's participants, as of the game's creation"""
+        as_of = match.game_creation / 1000
+        with self._lock:
+            for p in match.participants:
+                riot_id = participant_riot_id(p)
+                if riot_id and p.get("puuid"):
+                    self._remember(self.names, p["puuid"], riot_id, as_of)
+    
+    def _lookup(self, riot_api, puuids, region):
+        """Look up the accounts of some PUUIDs concurrently"""
+        logger.info(f"Looking up {len(puuids)} player names")
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            accounts = list(executor.map(lambda puuid: riot_api.get_account_by_puuid(puuid, region), puuids))
+        
+        now = time.time()
+        with self._lock:
+            for puuid, account in zip(puuids, accounts):
+                name = format_riot_id(account.get("gameName"), account.get("tagLine")) if account else None
+                if name:
+                    self._remember(self.names, puuid, name, now)
+                else:
+                    logger.warning(f"Could not look up the name of player {puuid}")
+    
+    def resolve(self, riot_api, match):
+        """Get the names of a match's players by PUUID, looking up only those still unknown"""
+        self.learn_from_match(match)
+        
+        now = time.time()
+        missing = [
+            p["puuid"] for p in match.participants
+            if p.get("puuid") and not participant_riot_id(p)
+            and now - self.names.get(p["puuid"], {}).get("as_of", 0) >= self.ttl
+        ]
+        if missing and riot_api is not None:
+            self._lookup(riot_api, missing, riot_api.get_region_from_code(match.match_id))
+        
+        self.save()
+        return {p["puuid"]: self.get(p["puuid"]) for p in match.participants if self.get(p.get("puuid"))}
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from collections import deque
+from config import API_RATE_LIMITS
+
+logger = logging.getLogger(__name__)
+
+def parse_rate_limits(header):
+    """Parse a rate limit header such as "20:1,100:120" into (requests, seconds) windows
+
+    Returns None if the header cannot be parsed.
+    """
+    limits = []
+    for window in header.split(","):
+        count, _, seconds = window.partition(":")
+        try:
+            limits.append((int(count), int(seconds)))
+        except ValueError:
+            return None
+    return limits or None
+
+def mask_key(key):
+    """Shorten an API key for logs"""
+    return f"{key[:10]}..."
+
+class RateBudget:
+    """Sliding-window request budget of one API key in one region"""
+    
+    def __init__(self, limits):
+        self.limits = list(limits)
+        self.sent = deque()
+        self.blocked_until = 0
+    
+    def _sent_within(self, seconds, now):
+        return [sent_at for sent_at in self.sent if sent_at > now - seconds]
+    
+    def available(self, now):
+        """Get the number of requests that can be sent right now"""
+        if now < self.blocked_until:
+            return 0
+        
+        # Forget requests older than the longest window
+        longest = max(seconds for _, seconds in self.limits)
+        while self.sent and self.sent[0] <= now - longest:
+            self.sent.popleft()
+        
+        return min(count - len(self._sent_within(seconds, now)) for count, seconds in self.limits)
+    
+    def wait_time(self, now):
+        """Get how long until a request can be sent"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        
+        wait = 0
+        for count, seconds in self.limits:
+            recent = self._sent_within(seconds, now)
+            if len(recent) >= count:
+                wait = max(wait, recent[len(recent) - count] + seconds - now)
+        return wait
+    
+    def spend(self, now):
+        """Count a request sent now"""
+        self.sent.append(now)
+
+class KeyPool:
+    """Pool of API keys, each with its own rate budget in each region
+
+    Every request goes to the key with the most budget left in its region,
+    so throughput grows with the number of keys and regions don't hold each
+    other up. A key rejected for a scope of endpoints (e.g. tournament
+    endpoints) is taken out of rotation for that scope. Processes sharing
+    the same keys each use a `share` of their rate limits. A key that turns
+    out to belong to another application is retired from every scope.
+    """
+    
+    def __init__(self, keys, limits=API_RATE_LIMITS, share=1):
+        self.keys = list(dict.fromkeys(keys))
+        self.share = share
+        self.limits = self._shared(limits)
+        self.budgets = {}
+        self.rejected = {}
+        self.retired = set()
+        self._lock = threading.Lock()
+    
+    def _shared(self, limits):
+        return [(max(1, int(count * self.share)), seconds) for count, seconds in limits]
+    
+    def _budget(self, key, region):
+        if (key, region) not in self.budgets:
+            self.budgets[(key, region)] = RateBudget(self.limits)
+        return self.budgets[(key, region)]
+    
+    def usable_keys(self, scope):
+        """Get the keys still in rotation for a scope of endpoints"""
+        return [key for key in self.keys if key not in self.rejected.get(scope, ()) and key not in self.retired]
+    
+    def acquire(self, region, scope="match", key=None):
+        """Wait for a key with budget left in a region and spend one request on it
+
+        With a key, waits for that key only. Returns None if every key (or
+        the given one) was rejected for the scope.
+        """
+        while True:
+            with self._lock:
+                keys = [usable for usable in self.usable_keys(scope) if key is None or usable == key]
+                if not keys:
+                    return None
+                
+                now = time.monotonic()
+                budgets = [(self._budget(usable, region), usable) for usable in keys]
+                budget, chosen = max(budgets, key=lambda item: item[0].available(now))
+                if budget.available(now) > 0:
+                    budget.spend(now)
+                    return chosen
+                
+                wait = min(budget.wait_time(now) for budget, _ in budgets)
+            
+            logger.debug(f"Rate limit reached for every key in {region}, waiting {wait:.2f}s")
+            time.sleep(wait)
+    
+    def reject(self, key, scope="match"):
+        """Take a key out of rotation for a scope of endpoints"""
+        with self._lock:
+            rejected = self.rejected.setdefault(scope, set())
+            if key not in rejected:
+                rejected.add(key)
+                logger.warning(f"API key {mask_key(key)} was rejected, removed from {scope} rotation "
+                               f"({len(self.usable_keys(scope))} keys left)")
+    
+    def retire(self, key):
+        """Take a key out of rotation for every scope"""
+        with self._lock:
+            if key not in self.retired:
+                self.retired.add(key)
+                logger.error(f"API key {mask_key(key)} removed from the pool ({len(self.keys) - len(self.retired)} "
+                             f"keys left)")
+    
+    def block(self, key, region, seconds):
+        """Stop using a key in a region for a while (after a 429)"""
+        with self._lock:
+            budget = self._budget(key, region)
+            budget.blocked_until = max(budget.blocked_until, time.monotonic() + seconds)
+        logger.warning(f"API key {mask_key(key)} rate limited in {region}, pausing it for {seconds}s")
+    
+    def update_limits(self, key, region, header):
+        """Use the rate limits reported by the API for a key in a region"""
+        limits = parse_rate_limits(header)
+        if limits:
+            limits = self._shared(limits)
+        with self._lock:
+            budget = self._budget(key, region)
+            if limits and limits != budget.limits:
+                budget.limits = limits
+                logger.debug(f"Rate limits of {mask_key(key)} in {region}: {header}")
@@ -1,52 +1,170 @@
+from datetime import datetime
+from functools import cached_property
+
+
 class Match:
-    """Model for a League of Legends match"""
-    
+    """Model for a League of Legends match
+
+    Wraps the raw match and timeline payloads without copying them. Every
+    derived view (participant/team indexes, opponents, timeline frames) is
+    built on first access and memoized, so it is computed at most once per
+    match no matter how many stats ask for it.
+    """
+
+    # "__dict__" is kept so that functools.cached_property can store its values
+    __slots__ = ("match_data", "timeline_data", "__dict__")
+
     def __init__(self, match_data, timeline_data=None):
         self.match_data = match_data
         self.timeline_data = timeline_data
-        self.metadata = match_data.get("metadata", {})
-        self.info = match_data.get("info", {})
-        self.match_id = self.metadata.get("matchId", "unknown")
-        self.participants = self.info.get("participants", [])
-        self.teams = self.info.get("teams", [])
-        
+
+    @cached_property
+    def metadata(self):
+        """Get the match metadata"""
+        return self.match_data.get("metadata", {})
+
+    @cached_property
+    def info(self):
+        """Get the match info"""
+        return self.match_data.get("info", {})
+
+    @cached_property
+    def match_id(self):
+        """Get the match ID"""
+        return self.metadata.get("matchId", "unknown")
+
+    @cached_property
+    def participants(self):
+        """Get the list of participants"""
+        return self.info.get("participants", [])
+
+    @cached_property
+    def teams(self):
+        """Get the list of teams"""
+        return self.info.get("teams", [])
+
     @property
     def game_creation(self):
         """Get the game creation timestamp"""
         return self.info.get("gameCreation", 0)
-    
+
+    @cached_property
+    def game_datetime(self):
+        """Get the game creation time as a local datetime"""
+        return datetime.fromtimestamp(self.game_creation / 1000)
+
     @property
     def game_duration(self):
         """Get the game duration in seconds"""
         return self.info.get("gameDuration", 0)
-    
+
     @property
     def game_duration_minutes(self):
         """Get the game duration in minutes"""
         return self.game_duration / 60
-    
+
     @property
     def game_mode(self):
         """Get the game mode"""
         return self.info.get("gameMode", "Unknown")
-    
-    @property
+
+    @cached_property
+    def participants_by_id(self):
+        """Get participants indexed by participant ID"""
+        return {p.get("participantId"): p for p in self.participants}
+
+    @cached_property
+    def team_participants(self):
+        """Get participants grouped by team ID, in payload order"""
+        teams = {}
+        for p in self.participants:
+            team_id = p.get("teamId")
+            if team_id:
+                teams.setdefault(team_id, []).append(p)
+        return teams
+
+    @cached_property
     def team_ids(self):
         """Get a list of team IDs in the match"""
-        team_ids = []
+        return list(self.team_participants)
+
+    @cached_property
+    def opponent_ids(self):
+        """Get the direct opponent's participant ID for every participant
+
+        Opponents are matched by team position first (Summoner's Rift games),
+        then by timeline lane, and finally fall back to the first player of
+        another team.
+        """
+        by_position = {}
         for p in self.participants:
+            position = p.get("teamPosition", "")
+            if position:
+                by_position.setdefault(position, []).append(p)
+
+        lanes = {}
+        if self.frames:
+            for participant in self.timeline_info.get("participants", []):
+                if "lane" in participant:
+                    lanes.setdefault(participant["lane"], []).append(participant["participantId"])
+
+        opponents = {}
+        for p in self.participants:
+            participant_id = p.get("participantId")
             team_id = p.get("teamId")
-            if team_id and team_id not in team_ids:
-                team_ids.append(team_id)
-        return team_ids
-    
+            position = p.get("teamPosition", "")
+
+            opponent_id = next(
+                (o["participantId"] for o in by_position.get(position, [])
+                 if o["participantId"] != participant_id and o["teamId"] != team_id),
+                None)
+
+            if opponent_id is None and position:
+                opponent_id = next(
+                    (pid for pid in lanes.get(position, []) if pid != participant_id), None)
+
+            if opponent_id is None:
+                opponent_id = next(
+                    (o["participantId"] for o in self.participants if o["teamId"] != team_id), None)
+
+            opponents[participant_id] = opponent_id
+        return opponents
+
+    @cached_property
+    def timeline_info(self):
+        """Get the timeline info (empty if no timeline was provided)"""
+        if not self.timeline_data:
+            return {}
+        return self.timeline_data.get("info", {})
+
+    @cached_property
+    def frames(self):
+        """Get the timeline frames"""
+        return self.timeline_info.get("frames", [])
+
+    @cached_property
+    def _frames_at(self):
+        return {}
+
+    def frame_at(self, timestamp):
+        """Get the first frame at or after a timestamp (in ms)
+
+        Games that end before the timestamp return their last frame.
+        """
+        if timestamp not in self._frames_at:
+            frames = self.frames
+            frame = None
+            if frames and frames[-1]["timestamp"] < timestamp:
+                frame = frames[-1]
+            else:
+                frame = next((f for f in frames if f["timestamp"] >= timestamp), None)
+            self._frames_at[timestamp] = frame
+        return self._frames_at[timestamp]
+
     def get_team_participants(self, team_id):
         """Get all participants for a specific team"""
-        return [p for p in self.participants if p.get("teamId") == team_id]
-    
+        return self.team_participants.get(team_id, [])
+
     def get_participant_by_id(self, participant_id):
         """Get a participant by their ID"""
-        for p in self.participants:
-            if p.get("participantId") == participant_id:
-                return p
-        return None
\ No newline at end of file
+        return self.participants_by_id.get(participant_id)
@@ -2,6 +2,21 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def to_number(value):
+    """Convert a stat value to a float, or None for N/A and non-numeric values"""
+    # Handle percentage strings
+    if isinstance(value, str) and "%" in value:
+        value = value.replace("%", "")
+    
+    # Skip N/A or non-numeric values
+    if value == "N/A" or value is None:
+        return None
+    
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
 def calculate_team_average(team_stats, stat_key):
     """Calculate the average of a specific stat for all team members"""
     if not team_stats:
@@ -9,21 +24,9 @@ def calculate_team_average(team_stats, stat_key):
     
     values = []
     for player in team_stats:
-        value = player.get(stat_key)
-        
-        # Handle percentage strings
-        if isinstance(value, str) and "%" in value:
-            try:
-                value = float(value.replace("%", ""))
-            except ValueError:
-                value = None
-        
-        # Skip N/A or non-numeric values
-        if value != "N/A" and value is not None:
-            try:
-                values.append(float(value))
-            except (ValueError, TypeError):
-                pass
+        value = to_number(player.get(stat_key))
+        if value is not None:
+            values.append(value)
     
     if not values:
         return 0
@@ -58,6 +61,85 @@ def calculate_team_aggregates(team_stats):
         "win": win
     }
 
+# Player stats averaged over games in the summary aggregates
+AVERAGED_STATS = ["DPM", "VPM", "CSperMin", "goldDiffAt15", "expDiffAt15", "killParticipation"]
+
+# Team aggregates averaged over team games in the per-day summary
+AVERAGED_TEAM_STATS = ["totalKills", "totalDeaths", "totalAssists", "avgDPM", "avgVPM", "avgCSPerMin"]
+
+TEAM_SIDES = {100: "Blue", 200: "Red"}
+
+def new_summary_aggregates():
+    """Create empty running aggregates for the summary sheets"""
+    return {"players": {}, "champions": {}, "days": {}}
+
+def _new_player_totals():
+    return {
+        "games": 0, "wins": 0, "kills": 0, "deaths": 0, "assists": 0, "soloKills": 0,
+        "sums": {stat: 0 for stat in AVERAGED_STATS},
+        "counts": {stat: 0 for stat in AVERAGED_STATS},
+        "picks": {},
+    }
+
+def _add_player_game(totals, player, pick):
+    """Add one player game to running totals"""
+    totals["games"] += 1
+    totals["wins"] += 1 if player.get("win") else 0
+    for stat in ("kills", "deaths", "assists", "soloKills"):
+        totals[stat] += player.get(stat, 0)
+    
+    for stat in AVERAGED_STATS:
+        value = to_number(player.get(stat))
+        if value is not None:
+            totals["sums"][stat] += value
+            totals["counts"][stat] += 1
+    
+    totals["picks"][pick] = totals["picks"].get(pick, 0) + 1
+
+def update_summary_aggregates(aggregates, all_match_stats):
+    """Fold new team stats into the running aggregates of the summary sheets
+
+    Aggregates only ever grow, so each match only has to be added once,
+    however many matches were aggregated before it.
+    """
+    for match_stats in all_match_stats:
+        team_stats = match_stats["team_stats"]
+        
+        for player in team_stats:
+            # Players are keyed by PUUID so renamed players stay a single entry
+            name = player.get("summonerName", "Unknown")
+            player_key = player.get("puuid") or name
+            champion = player.get("champion", "Unknown")
+            
+            # Players seeded by name (from a sheet without PUUIDs) move to their PUUID
+            if player_key not in aggregates["players"] and name in aggregates["players"]:
+                aggregates["players"][player_key] = aggregates["players"].pop(name)
+                for champion_totals in aggregates["champions"].values():
+                    if name in champion_totals["picks"]:
+                        champion_totals["picks"][player_key] = champion_totals["picks"].pop(name)
+            
+            player_totals = aggregates["players"].setdefault(player_key, _new_player_totals())
+            player_totals["name"] = name
+            _add_player_game(player_totals, player, champion)
+            
+            champion_totals = aggregates["champions"].setdefault(champion, _new_player_totals())
+            _add_player_game(champion_totals, player, player_key)
+        
+        team = calculate_team_aggregates(team_stats)
+        if not team:
+            continue
+        
+        side = TEAM_SIDES.get(match_stats.get("team_id"), str(match_stats.get("team_id")))
+        day_totals = aggregates["days"].setdefault(str(match_stats["day"]), {}).setdefault(side, {
+            "games": 0, "wins": 0, "sums": {stat: 0 for stat in AVERAGED_TEAM_STATS},
+        })
+        day_totals["games"] += 1
+        day_totals["wins"] += 1 if team["win"] else 0
+        for stat in AVERAGED_TEAM_STATS:
+            day_totals["sums"][stat] += team[stat]
+    
+    return aggregates
+
 def sort_players_by_position(team_stats):
     """Sort players by their position (TOP, JUNGLE, MIDDLE, BOTTOM, UTILITY)"""
     position_order = {
@@ -1,225 +1,168 @@
 import logging
-from datetime import datetime
+from riot.identity import participant_riot_id
+from stats.registry import STATS
 
 logger = logging.getLogger(__name__)
 
-def find_opponent_participant_id(match_data, timeline_data, player_participant_id, player_position, player_team_id):
-    """Find the participant ID of the direct opponent"""
-    logger.debug(f"Finding opponent for participant ID: {player_participant_id}, position: {player_position}")
+# Version of the extracted stats, stored with every entry. Bump it when a
+# stat or the way it is extracted changes, so stats written by older
+# versions can be re-derived from the stored payloads (see pipeline.recompute).
+EXTRACTOR_VERSION = 1
+
+class PlayerContext:
+    """Everything a stat can read for one player, gathered by the extraction pass"""
+
+    def __init__(self, match, player, opponent_id, team_totals, counts, checkpoints, names):
+        self.match = match
+        self.player = player
+        self.participant_id = player["participantId"]
+        self.team_id = player["teamId"]
+        self.opponent_id = opponent_id
+        self.minutes = match.game_duration_minutes
+        self._team_totals = team_totals
+        self._counts = counts
+        self._checkpoints = checkpoints
+        self._names = names
     
-    if not match_data or not timeline_data:
-        logger.warning("Missing match data or timeline data")
-        return None
-    
-    info = match_data["info"]
-    
-    # First try to find opponent by position (for Summoner's Rift games)
-    for p in info["participants"]:
-        if (p["participantId"] != player_participant_id and 
-            p["teamId"] != player_team_id and
-            p["teamPosition"] == player_position and 
-            p["teamPosition"] != ""):
-            logger.debug(f"Found opponent by position: {p['participantId']}")
-            return p["participantId"]
-    
-    # If no position match, find opponent by lane from timeline
-    if timeline_data.get("info", {}).get("frames", []) and player_position and player_position != "":
-        for participant in timeline_data["info"]["participants"]:
-            if (participant["participantId"] != player_participant_id and
-                "lane" in participant and
-                participant["lane"] == player_position):
-                logger.debug(f"Found opponent by lane: {participant['participantId']}")
-                return participant["participantId"]
-    
-    # Last resort: pick a random opponent
-    for p in info["participants"]:
-        if p["teamId"] != player_team_id:
-            logger.debug(f"Using random opponent: {p['participantId']}")
-            return p["participantId"]
-    
-    logger.warning("Could not find opponent")
-    return None
+    @property
+    def name(self):
+        """Get the player's most recent known Riot ID, falling back to the payload's names"""
+        return (self._names.get(self.player.get("puuid")) or participant_riot_id(self.player)
+                or self.player.get("summonerName") or "Unknown")
+    
+    def field(self, name, default=0):
+        """Get one of the player's participant fields"""
+        return self.player.get(name, default)
+    
+    def per_minute(self, value):
+        """Get a value per minute of game time"""
+        return round(value / self.minutes, 2) if self.minutes > 0 else 0
+    
+    def team_total(self, field):
+        """Get a declared participant field summed over the player's team"""
+        return self._team_totals.get(self.team_id, {}).get(field, 0)
+    
+    def count(self, key):
+        """Get how many of a stat's declared events credited the player"""
+        return self._counts[key].get(self.participant_id, 0)
+    
+    def team_count(self, key):
+        """Get how many of a stat's declared events credited the player's team"""
+        return self._counts[key].get(("team", self.team_id), 0)
+    
+    def frame_diff(self, minute, key):
+        """Get the difference with the direct opponent for a frame value at a declared checkpoint
+
+        Returns "N/A" when either player's frame lacks the value.
+        """
+        frame = self._checkpoints[minute]
+        if not self.opponent_id or not frame:
+            return "N/A"
+        
+        player_frame = frame["participantFrames"].get(str(self.participant_id), {})
+        opponent_frame = frame["participantFrames"].get(str(self.opponent_id), {})
+        if key not in player_frame or key not in opponent_frame:
+            return "N/A"
+        return player_frame[key] - opponent_frame[key]
+
+class StatPlan:
+    """The inputs of a set of stats, merged so they can all be gathered in one pass"""
 
-def extract_player_stats(match_data, timeline_data, participant_id):
-    """Extract stats for a specific player by participant ID"""
-    logger.info(f"Extracting stats for participant ID: {participant_id}")
+    def __init__(self, stats):
+        self.stats = list(stats)
+        self.fields = sorted({field for stat in self.stats for field in stat.fields})
+        self.checkpoints = sorted({minute for stat in self.stats for minute in stat.checkpoints})
+        self.event_stats = {}
+        for stat in self.stats:
+            for event_type in stat.events:
+                self.event_stats.setdefault(event_type, []).append(stat)
     
-    if not match_data or not timeline_data:
+    def gather(self, match):
+        """Read the declared team totals, checkpoint frames and event counts of a match
+
+        Participants, frames and events are each walked once, whatever the
+        number of stats.
+        """
+        team_totals = {}
+        for p in match.participants:
+            totals = team_totals.setdefault(p.get("teamId"), dict.fromkeys(self.fields, 0))
+            for field in self.fields:
+                totals[field] += p.get(field, 0)
+        
+        checkpoints = {minute: match.frame_at(minute * 60 * 1000) for minute in self.checkpoints}
+        
+        # Event counts per participant ID, and per ("team", team ID)
+        teams = {p.get("participantId"): p.get("teamId") for p in match.participants}
+        counts = {stat.key: {} for stats in self.event_stats.values() for stat in stats}
+        for frame in match.frames:
+            for event in frame.get("events", []):
+                for stat in self.event_stats.get(event.get("type"), ()):
+                    stat_counts = counts[stat.key]
+                    credited = set(stat.credit(event))
+                    for participant_id in credited:
+                        stat_counts[participant_id] = stat_counts.get(participant_id, 0) + 1
+                    for team_id in {teams[pid] for pid in credited if pid in teams}:
+                        stat_counts[("team", team_id)] = stat_counts.get(("team", team_id), 0) + 1
+        
+        return team_totals, counts, checkpoints
+
+def extract_players_stats(match, stats=None, names=None):
+    """Extract the registered stats of every player of a match, by participant ID
+
+    The inputs of all stats are gathered in a single pass over the match
+    before each stat is computed from them. Player names resolved by PUUID
+    (see riot.identity) take precedence over the payload's names.
+    """
+    logger.info(f"Extracting stats for match: {match.match_id}")
+    
+    if not match.match_data or not match.timeline_data:
         logger.warning("Missing match data or timeline data")
-        return None
+        return {}
     
-    try:
-        metadata = match_data["metadata"]
-        info = match_data["info"]
-        
-        # Find player data by participant ID
-        player_data = None
-        for p in info["participants"]:
-            if p["participantId"] == participant_id:
-                player_data = p
-                break
-        
-        if not player_data:
-            logger.warning(f"Could not find player data for participant ID: {participant_id}")
-            return None
-        
-        logger.debug(f"Found player data: {player_data.get('summonerName')}")
-        
-        player_participant_id = player_data["participantId"]
-        player_position = player_data.get("teamPosition", "")
-        player_team = player_data["teamId"]
-        
-        # Find opponent
-        opponent_participant_id = find_opponent_participant_id(
-            match_data, timeline_data, player_participant_id, player_position, player_team)
-        
-        # Calculate game duration in minutes
-        game_duration = info.get("gameDuration", 0)
-        game_duration_minutes = game_duration / 60
-        
-        # Calculate DPM (Damage Per Minute)
-        damage = player_data.get("totalDamageDealtToChampions", 0)
-        dpm = round(damage / game_duration_minutes, 2) if game_duration_minutes > 0 else 0
-        
-        # Calculate VPM (Vision Per Minute)
-        vision_score = player_data.get("visionScore", 0)
-        vpm = round(vision_score / game_duration_minutes, 2) if game_duration_minutes > 0 else 0
-        
-        # Calculate CS Per Minute
-        minions = player_data.get("totalMinionsKilled", 0)
-        neutral_minions = player_data.get("neutralMinionsKilled", 0)
-        total_cs = minions + neutral_minions
-        cs_per_minute = round(total_cs / game_duration_minutes, 2) if game_duration_minutes > 0 else 0
-        
-        # Calculate Kill Participation
-        kills = player_data.get("kills", 0)
-        assists = player_data.get("assists", 0)
-        
-        team_kills = 0
-        for p in info["participants"]:
-            if p["teamId"] == player_team:
-                team_kills += p.get("kills", 0)
-        
-        if team_kills > 0:
-            kill_participation = round(100 * (kills + assists) / team_kills, 2)
-            kill_participation = min(kill_participation, 100)
-        else:
-            kill_participation = 0
-        
-        logger.debug(f"Calculated KP: {kill_participation}%")
-        
-        # Extract gold difference at 15 minutes
-        gold_diff_15 = "N/A"
-        # Extract exp difference at 15 minutes
-        exp_diff_15 = "N/A"
-        frames = timeline_data.get("info", {}).get("frames", [])
-        
-        if opponent_participant_id and frames:
-            frame_15_min_timestamp = 15 * 60 * 1000
-            
-            if frames and frames[-1]["timestamp"] < frame_15_min_timestamp:
-                frame_15 = frames[-1]
-                logger.debug(f"Game shorter than 15 min, using last frame at {frame_15['timestamp'] / 60000} min")
-            else:
-                for frame in frames:
-                    if frame["timestamp"] >= frame_15_min_timestamp:
-                        frame_15 = frame
-                        logger.debug(f"Found frame at 15 min: {frame_15['timestamp'] / 60000} min")
-                        break
+    plan = StatPlan(STATS if stats is None else stats)
+    team_totals, counts, checkpoints = plan.gather(match)
+    
+    players_stats = {}
+    for player in match.participants:
+        participant_id = player.get("participantId")
+        try:
+            opponent_id = match.opponent_ids.get(participant_id)
+            if opponent_id is None:
+                logger.warning(f"Could not find opponent for participant ID: {participant_id}")
             
-            if 'frame_15' in locals():
-                player_frame = frame_15["participantFrames"].get(str(player_participant_id), {})
-                opponent_frame = frame_15["participantFrames"].get(str(opponent_participant_id), {})
-                
-                if player_frame and opponent_frame:
-                    # Gold difference
-                    if "totalGold" in player_frame and "totalGold" in opponent_frame:
-                        player_gold = player_frame["totalGold"]
-                        opponent_gold = opponent_frame["totalGold"]
-                        gold_diff_15 = player_gold - opponent_gold
-                        logger.debug(f"Gold diff at 15: {gold_diff_15}")
-                    
-                    # Experience difference
-                    if "xp" in player_frame and "xp" in opponent_frame:
-                        player_xp = player_frame["xp"]
-                        opponent_xp = opponent_frame["xp"]
-                        exp_diff_15 = player_xp - opponent_xp
-                        logger.debug(f"Exp diff at 15: {exp_diff_15}")
-        
-        # Extract solo kills
-        solo_kills = 0
-        for frame in frames:
-            for event in frame.get("events", []):
-                if (event["type"] == "CHAMPION_KILL" and 
-                    event.get("killerId") == player_participant_id and 
-                    len(event.get("assistingParticipantIds", [])) == 0):
-                    solo_kills += 1
-        
-        logger.debug(f"Solo kills: {solo_kills}")
-        
-        # Get player's summoner name
-        summoner_name = player_data.get("summonerName", "Unknown")
-        
-        # Extract relevant data
-        match_stats = {
-            "matchId": metadata["matchId"],
-            "summonerName": summoner_name,
-            "gameCreation": datetime.fromtimestamp(info["gameCreation"] / 1000).strftime('%Y-%m-%d %H:%M:%S'),
-            "gameDate": datetime.fromtimestamp(info["gameCreation"] / 1000).strftime('%Y-%m-%d'),
-            "gameTime": datetime.fromtimestamp(info["gameCreation"] / 1000).strftime('%H:%M:%S'),
-            "gameDuration": round(game_duration_minutes, 2),
-            "gameMode": info.get("gameMode", "Unknown"),
-            "champion": player_data.get("championName", "Unknown"),
-            "championLevel": player_data.get("champLevel", 0),
-            "position": player_position,
-            "kills": kills,
-            "deaths": player_data.get("deaths", 0),
-            "assists": assists,
-            "kda": "Perfect" if player_data.get("deaths", 0) == 0 else round((kills + assists) / player_data.get("deaths", 1), 2),
-            "DPM": dpm,
-            "VPM": vpm,
-            "CSperMin": cs_per_minute,
-            "goldDiffAt15": gold_diff_15,
-            "expDiffAt15": exp_diff_15,
-            "soloKills": solo_kills,
-            "killParticipation": f"{kill_participation}%",
-            "win": player_data.get("win", False),
-        }
-        
-        logger.info(f"Successfully extracted stats for {summoner_name}")
-        return match_stats
-        
-    except Exception as e:
-        logger.error(f"Error extracting player stats: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
-        return None
+            ctx = PlayerContext(match, player, opponent_id, team_totals, counts, checkpoints, names or {})
+            players_stats[participant_id] = {stat.key: stat.compute(ctx) for stat in plan.stats}
+            logger.debug(f"Extracted stats for participant ID {participant_id}: {ctx.name}")
+        
+        except Exception as e:
+            logger.error(f"Error extracting stats for participant ID {participant_id}: {str(e)}")
+            import traceback
+            logger.error(traceback.format_exc())
+    
+    logger.info(f"Extracted stats for {len(players_stats)}/{len(match.participants)} players")
+    return players_stats
 
-def extract_team_stats(match_data, timeline_data, team_id):
-    """Extract stats for all players on a specific team"""
+def extract_team_stats(match, team_id, players_stats=None):
+    """Extract stats for all players on a specific team
+
+    Pass the result of extract_players_stats to share one extraction pass
+    between the teams of a match.
+    """
     logger.info(f"Extracting team stats for team ID: {team_id}")
     
-    team_stats = []
-    
-    if not match_data:
+    if not match.match_data:
         logger.warning("No match data available")
-        return team_stats
+        return []
     
-    info = match_data["info"]
+    if players_stats is None:
+        players_stats = extract_players_stats(match)
     
     # Get all participant IDs for the team
-    team_participant_ids = []
-    for p in info["participants"]:
-        if p["teamId"] == team_id:
-            team_participant_ids.append(p["participantId"])
+    team_participant_ids = [p["participantId"] for p in match.get_team_participants(team_id)]
     
     logger.debug(f"Found {len(team_participant_ids)} participants for team {team_id}")
     
-    # Extract stats for each team member
-    for participant_id in team_participant_ids:
-        player_stats = extract_player_stats(match_data, timeline_data, participant_id)
-        if player_stats:
-            team_stats.append(player_stats)
+    team_stats = [players_stats[pid] for pid in team_participant_ids if pid in players_stats]
     
     logger.info(f"Extracted stats for {len(team_stats)}/{len(team_participant_ids)} team members")
-    return team_stats
\ No newline at end of file
+    return team_stats
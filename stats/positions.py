@@ -0,0 +1,241 @@
+import logging
+import numpy as np
+from riot.identity import participant_riot_id
+
+logger = logging.getLogger(__name__)
+
+# Summoner's Rift coordinates run from about 0 (blue base, bottom left) to
+# about 15000 (red base, top right) on both axes
+MAP_SIZE = 15000
+HEATMAP_BINS = 10  # Heatmap cells per side of the map
+LANE_WIDTH = 2000  # Distance from the map edges that still counts as top or bot lane
+MID_WIDTH = 2000  # Largest |x - y| that still counts as mid lane
+BASE_SIZE = 5000  # Largest x + y (from either base's corner) that counts as inside a base
+LANING_END = 14  # Last minute of the laning phase
+JUNGLE_PATH_END = 8  # Last minute of the early jungle path
+
+ZONES = ["base", "top", "mid", "bot", "jungle"]
+BASE, TOP, MID, BOT, JUNGLE = range(len(ZONES))
+POSITION_ZONES = {"TOP": TOP, "MIDDLE": MID, "BOTTOM": BOT, "UTILITY": BOT, "JUNGLE": JUNGLE}
+
+FRAME_FIELDS = ["x", "y", "totalGold", "xp", "cs"]
+
+def _frame_values(participant_frame):
+    position = participant_frame.get("position") or {}
+    cs = participant_frame.get("minionsKilled", 0) + participant_frame.get("jungleMinionsKilled", 0)
+    return (position.get("x", np.nan), position.get("y", np.nan), participant_frame.get("totalGold", np.nan),
+            participant_frame.get("xp", np.nan), cs if participant_frame else np.nan)
+
+class FrameArrays:
+    """A match's timeline participant frames, loaded once into (frame, participant) arrays
+
+    Participants are the columns, in participant ID order; values missing
+    from a frame are NaN. Every analysis below works on these arrays
+    instead of walking the frame dicts again.
+    """
+
+    def __init__(self, match):
+        participants = sorted(match.participants, key=lambda p: p.get("participantId", 0))
+        self.participants = participants
+        self.participant_ids = np.array([p.get("participantId") for p in participants])
+        self.team_ids = np.array([p.get("teamId") for p in participants])
+        self.lanes = np.array([POSITION_ZONES.get(p.get("teamPosition", ""), -1) for p in participants])
+
+        frames = match.frames
+        self.minutes = np.array([frame.get("timestamp", 0) / 60000 for frame in frames])
+        values = np.array([
+            [_frame_values(frame.get("participantFrames", {}).get(str(pid), {})) for pid in self.participant_ids]
+            for frame in frames
+        ], dtype=float).reshape(len(frames), len(participants), len(FRAME_FIELDS))
+        self.x, self.y, self.gold, self.xp, self.cs = np.moveaxis(values, 2, 0)
+        self.zones = classify_zones(self.x, self.y)
+
+    def window(self, start, end):
+        """Get a mask of the frames between two minutes (inclusive)
+
+        Frames are matched by their whole minute, since their timestamps land
+        a few milliseconds after it.
+        """
+        minutes = np.floor(self.minutes)
+        return (minutes >= start) & (minutes <= end)
+
+def classify_zones(x, y):
+    """Classify positions into ZONES indexes (-1 where the position is unknown)
+
+    Bases take precedence over mid lane, and mid lane over the side lanes.
+    """
+    zones = np.full(x.shape, JUNGLE)
+    zones[(x < LANE_WIDTH) | (y > MAP_SIZE - LANE_WIDTH)] = TOP
+    zones[(y < LANE_WIDTH) | (x > MAP_SIZE - LANE_WIDTH)] = BOT
+    zones[np.abs(x - y) < MID_WIDTH] = MID
+    zones[np.minimum(x + y, 2 * MAP_SIZE - x - y) < BASE_SIZE] = BASE
+    zones[np.isnan(x) | np.isnan(y)] = -1
+    return zones
+
+def position_heatmaps(frames, bins=HEATMAP_BINS):
+    """Count each participant's frames in every cell of a bins x bins grid over the map
+
+    Returns an array of counts indexed by (participant, x cell, y cell).
+    """
+    known = ~(np.isnan(frames.x) | np.isnan(frames.y))
+    participants = np.broadcast_to(np.arange(len(frames.participant_ids)), frames.x.shape)[known]
+    cells_x = np.clip((frames.x[known] * bins // MAP_SIZE).astype(int), 0, bins - 1)
+    cells_y = np.clip((frames.y[known] * bins // MAP_SIZE).astype(int), 0, bins - 1)
+
+    heatmaps = np.zeros((len(frames.participant_ids), bins, bins), dtype=int)
+    np.add.at(heatmaps, (participants, cells_x, cells_y), 1)
+    return heatmaps
+
+def zone_shares(zones):
+    """Get the percentage of each participant's known frames spent in each zone, as (participant, zone)"""
+    counts = (zones[:, :, None] == np.arange(len(ZONES))).sum(axis=0)
+    known = np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    return np.round(100 * counts / known, 1)
+
+def lane_metrics(frames, duration_minutes):
+    """Get lane presence and roaming metrics per participant
+
+    During the laning phase: the share of frames in the participant's own
+    lane (from their team position), the share spent away from it outside
+    the base, and the number of times they left it for another zone.
+    Over the whole game: the share of frames in each zone and the distance
+    travelled per minute.
+    """
+    laning = frames.window(1, LANING_END)
+    zones = frames.zones[laning]
+    known = zones >= 0
+    # Players without a team position have no lane to be in
+    in_lane = known & (zones == frames.lanes) & (frames.lanes >= 0)
+    away = known & ~in_lane & (zones != BASE)
+    laning_frames = np.maximum(known.sum(axis=0), 1)
+
+    distance = np.nansum(np.hypot(np.diff(frames.x, axis=0), np.diff(frames.y, axis=0)), axis=0)
+    return {
+        "lanePresence": np.round(100 * in_lane.sum(axis=0) / laning_frames, 1),
+        "roamShare": np.round(100 * away.sum(axis=0) / laning_frames, 1),
+        "roams": (in_lane[:-1] & away[1:]).sum(axis=0),
+        "zoneShares": zone_shares(frames.zones),
+        "distancePerMin": np.round(distance / duration_minutes, 1) if duration_minutes > 0 else np.zeros(len(distance)),
+    }
+
+def jungle_areas(frames):
+    """Name the area of every position, splitting the jungle by side and by team half
+
+    Jungle positions are "own"/"enemy" (river side of the participant's
+    team) and "top"/"bot" (side of the mid lane), e.g. "own top jungle".
+    """
+    top_side = frames.y > frames.x
+    # Team 100 starts bottom left, so its half of the map is below the river
+    own_half = (frames.x + frames.y < MAP_SIZE) == (frames.team_ids == frames.team_ids.min())
+    jungle = np.where(own_half, "own ", "enemy ").astype(object) + np.where(top_side, "top jungle", "bot jungle")
+    lanes = np.array([f"{zone} lane" if zone in ("top", "mid", "bot") else zone for zone in ZONES] + [""],
+                     dtype=object)
+    return np.where(frames.zones == JUNGLE, jungle, lanes[frames.zones])
+
+def jungle_paths(frames):
+    """Summarize the early pathing of every jungler (team position JUNGLE)
+
+    Returns per jungler column: the path through the map's areas until
+    JUNGLE_PATH_END, the side of the first jungle camp area, the share of
+    early frames in the enemy jungle and the early frames in each lane.
+    """
+    early = frames.window(1, JUNGLE_PATH_END)
+    areas = jungle_areas(frames)[early]
+    zones = frames.zones[early]
+
+    paths = {}
+    for column in np.flatnonzero(frames.lanes == JUNGLE):
+        path = [area for area in areas[:, column] if area]
+        path = [area for index, area in enumerate(path) if index == 0 or area != path[index - 1]]
+        first_jungle = next((area for area in path if area.endswith("jungle")), "")
+        known = max(int((zones[:, column] >= 0).sum()), 1)
+        paths[column] = {
+            "path": " > ".join(path),
+            "startSide": first_jungle.split(" ")[1] if first_jungle else "",
+            "enemyJungleShare": round(100 * sum(area.startswith("enemy") for area in areas[:, column]) / known, 1),
+            "topLaneFrames": int((zones[:, column] == TOP).sum()),
+            "midLaneFrames": int((zones[:, column] == MID).sum()),
+            "botLaneFrames": int((zones[:, column] == BOT).sum()),
+        }
+    return paths
+
+def lead_curves(frames):
+    """Get every team's gold, XP and CS at each frame, and its lead over the other teams
+
+    Returns {team ID: {"gold": [...], ...}}, with values per frame.
+    """
+    team_ids = sorted(set(frames.team_ids.tolist()))
+    totals = {
+        key: np.stack([np.nansum(values[:, frames.team_ids == team_id], axis=1) for team_id in team_ids], axis=1)
+        for key, values in (("gold", frames.gold), ("xp", frames.xp), ("cs", frames.cs))
+    }
+
+    curves = {}
+    for index, team_id in enumerate(team_ids):
+        others = np.delete(np.arange(len(team_ids)), index)
+        curve = {key: values[:, index] for key, values in totals.items()}
+        for key, values in totals.items():
+            best_other = values[:, others].max(axis=1) if len(others) else np.zeros(len(values))
+            curve[f"{key}Lead"] = values[:, index] - best_other
+        curves[team_id] = curve
+    return curves
+
+def _player_name(participant, names):
+    return (names.get(participant.get("puuid")) or participant_riot_id(participant)
+            or participant.get("summonerName") or "Unknown")
+
+def analyze_positions(match, names=None):
+    """Compute the positional analytics of a match from its timeline frames
+
+    Returns rows for each table: "players" (lane presence, roaming and zone
+    shares), "jungle" (early jungle paths), "leads" (team gold/XP/CS lead
+    curves, one row per team and frame) and "heatmaps" (frames per
+    participant and map cell, non-empty cells only).
+    """
+    if not match.frames:
+        logger.warning(f"No timeline frames for match {match.match_id}")
+        return {"players": [], "jungle": [], "leads": [], "heatmaps": []}
+
+    names = names or {}
+    frames = FrameArrays(match)
+    lanes = lane_metrics(frames, match.game_duration_minutes)
+    paths = jungle_paths(frames)
+    heatmaps = position_heatmaps(frames)
+
+    players = []
+    jungle = []
+    for column, participant in enumerate(frames.participants):
+        row = {
+            "match_id": match.match_id,
+            "participant_id": int(frames.participant_ids[column]),
+            "team_id": int(frames.team_ids[column]),
+            "summonerName": _player_name(participant, names),
+            "champion": participant.get("championName", "Unknown"),
+            "position": participant.get("teamPosition", ""),
+        }
+        players.append({
+            **row,
+            "lanePresence": float(lanes["lanePresence"][column]),
+            "roamShare": float(lanes["roamShare"][column]),
+            "roams": int(lanes["roams"][column]),
+            "distancePerMin": float(lanes["distancePerMin"][column]),
+            **{f"{zone}Share": float(share) for zone, share in zip(ZONES, lanes["zoneShares"][column])},
+        })
+        if column in paths:
+            jungle.append({**row, **paths[column]})
+
+    leads = []
+    for team_id, curve in lead_curves(frames).items():
+        for index, minute in enumerate(frames.minutes):
+            leads.append({"match_id": match.match_id, "team_id": team_id, "minute": round(float(minute), 2),
+                          **{key: int(values[index]) for key, values in curve.items()}})
+
+    heatmap_rows = [
+        {"match_id": match.match_id, "participant_id": int(frames.participant_ids[column]),
+         "team_id": int(frames.team_ids[column]), "cell_x": int(cell_x), "cell_y": int(cell_y),
+         "frames": int(heatmaps[column, cell_x, cell_y])}
+        for column, cell_x, cell_y in zip(*np.nonzero(heatmaps))
+    ]
+
+    logger.info(f"Analyzed positions of {len(players)} players over {len(frames.minutes)} frames")
+    return {"players": players, "jungle": jungle, "leads": leads, "heatmaps": heatmap_rows}
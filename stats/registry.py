@@ -0,0 +1,121 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Stat:
+    """A per-player stat: the inputs it reads, how to compute it and its Excel column
+
+    Inputs are declared up front so the extraction engine can gather all of
+    them in a single pass over the match:
+
+    - fields: participant fields summed per team (read with ctx.team_total)
+    - checkpoints: minutes whose timeline frame is needed (ctx.frame_diff)
+    - events: timeline event types counted per participant and per team
+      (ctx.count / ctx.team_count), crediting the participant IDs returned
+      by credit(event)
+
+    compute(ctx) gets a PlayerContext and returns the stat's value, stored
+    under key. Stats with a header get a column on the stats sheet, filled
+    with cell(player_stats) (the value itself by default) and styled with
+    the role returned by style(player_stats) ("player" by default). dtype
+    ("string", "int", "float" or "bool") is the stat's type in flat exports.
+    """
+
+    def __init__(self, key, compute, header=None, cell=None, style=None, dtype="string",
+                 fields=(), checkpoints=(), events=(), credit=None):
+        self.key = key
+        self.compute = compute
+        self.dtype = dtype
+        self.header = header
+        self.cell = cell or (lambda player: player[key])
+        self.style = style or (lambda player: "player")
+        self.fields = tuple(fields)
+        self.checkpoints = tuple(checkpoints)
+        self.events = tuple(events)
+        self.credit = credit
+
+def _kda(ctx):
+    kills, deaths, assists = ctx.field("kills"), ctx.field("deaths"), ctx.field("assists")
+    return "Perfect" if deaths == 0 else round((kills + assists) / deaths, 2)
+
+def _kill_participation(ctx):
+    team_kills = ctx.team_total("kills")
+    if team_kills > 0:
+        kill_participation = min(round(100 * (ctx.field("kills") + ctx.field("assists")) / team_kills, 2), 100)
+    else:
+        kill_participation = 0
+    return f"{kill_participation}%"
+
+def _damage_share(ctx):
+    team_damage = ctx.team_total("totalDamageDealtToChampions")
+    return round(100 * ctx.field("totalDamageDealtToChampions") / team_damage, 2) if team_damage else 0
+
+def _objective_participation(ctx):
+    team_objectives = ctx.team_count("objectiveParticipation")
+    return round(100 * ctx.count("objectiveParticipation") / team_objectives, 2) if team_objectives else 0
+
+def _solo_killer(event):
+    """Credit the killer of an unassisted champion kill"""
+    return [] if event.get("assistingParticipantIds") else [event.get("killerId")]
+
+def _objective_takers(event):
+    """Credit the killer and assists of an epic monster"""
+    return [event.get("killerId")] + event.get("assistingParticipantIds", [])
+
+# Registered stats, in the order they are stored (and laid out as columns)
+STATS = [
+    Stat("matchId", lambda ctx: ctx.match.metadata["matchId"]),
+    Stat("summonerName", lambda ctx: ctx.name, header="Summoner Name"),
+    Stat("gameCreation", lambda ctx: ctx.match.game_datetime.strftime('%Y-%m-%d %H:%M:%S')),
+    Stat("gameDate", lambda ctx: ctx.match.game_datetime.strftime('%Y-%m-%d')),
+    Stat("gameTime", lambda ctx: ctx.match.game_datetime.strftime('%H:%M:%S')),
+    Stat("gameDuration", lambda ctx: round(ctx.minutes, 2), dtype="float"),
+    Stat("gameMode", lambda ctx: ctx.match.game_mode),
+    Stat("champion", lambda ctx: ctx.player.get("championName", "Unknown"), header="Champion"),
+    Stat("championLevel", lambda ctx: ctx.field("champLevel"), dtype="int"),
+    Stat("position", lambda ctx: ctx.player.get("teamPosition", ""), header="Position"),
+    Stat("kills", lambda ctx: ctx.field("kills"), header="K/D/A", dtype="int",
+         cell=lambda player: f"{player['kills']}/{player['deaths']}/{player['assists']}"),
+    Stat("deaths", lambda ctx: ctx.field("deaths"), dtype="int"),
+    Stat("assists", lambda ctx: ctx.field("assists"), dtype="int"),
+    # "Perfect" (no deaths) has no numeric value, so it is exported as empty
+    Stat("kda", _kda, header="KDA Ratio", dtype="float"),
+    Stat("DPM", lambda ctx: ctx.per_minute(ctx.field("totalDamageDealtToChampions")), header="DPM", dtype="float"),
+    Stat("VPM", lambda ctx: ctx.per_minute(ctx.field("visionScore")), header="VPM", dtype="float"),
+    Stat("CSperMin", lambda ctx: ctx.per_minute(ctx.field("totalMinionsKilled") + ctx.field("neutralMinionsKilled")),
+         header="CS/min", dtype="float"),
+    Stat("goldDiffAt15", lambda ctx: ctx.frame_diff(15, "totalGold"), header="Gold Diff@15", dtype="int",
+         checkpoints=[15]),
+    Stat("expDiffAt15", lambda ctx: ctx.frame_diff(15, "xp"), header="Exp Diff@15", dtype="int",
+         checkpoints=[15]),
+    Stat("soloKills", lambda ctx: ctx.count("soloKills"), header="Solo Kills", dtype="int",
+         events=["CHAMPION_KILL"], credit=_solo_killer),
+    Stat("killParticipation", _kill_participation, header="KP", dtype="float", fields=["kills"]),
+    Stat("win", lambda ctx: ctx.player.get("win", False), header="Win", dtype="bool",
+         cell=lambda player: "Win" if player["win"] else "Loss",
+         style=lambda player: "win" if player["win"] else "loss"),
+    # Kept in the data store only, so existing workbooks keep their layout
+    Stat("puuid", lambda ctx: ctx.player.get("puuid", "")),
+    Stat("firstBlood", lambda ctx: ctx.player.get("firstBloodKill", False), dtype="bool"),
+    Stat("damageShare", _damage_share, dtype="float", fields=["totalDamageDealtToChampions"]),
+    Stat("objectiveParticipation", _objective_participation, dtype="float",
+         events=["ELITE_MONSTER_KILL"], credit=_objective_takers),
+]
+
+def register_stat(stat):
+    """Register a stat, replacing any stat already registered under its key"""
+    for index, registered in enumerate(STATS):
+        if registered.key == stat.key:
+            STATS[index] = stat
+            logger.debug(f"Replaced stat: {stat.key}")
+            return
+    STATS.append(stat)
+    logger.debug(f"Registered stat: {stat.key}")
+
+def excel_columns():
+    """Get the stats laid out as columns on the stats sheet, in order"""
+    return [stat for stat in STATS if stat.header]
+
+def excel_headers():
+    """Get the column headers of the stats sheet"""
+    return [stat.header for stat in excel_columns()]
@@ -1,10 +1,15 @@
 import re
 import logging
+from config import REGION_MAP
 
 logger = logging.getLogger(__name__)
 
-def parse_tournament_code(code):
-    """Parse tournament code to extract information (day, match number, etc.)"""
+def parse_tournament_code(code, interactive=True, default_day="1", default_match="1"):
+    """Parse tournament code to extract information (day, match number, etc.)
+
+    Day and match numbers missing from the code are asked to the user, or
+    take their default values when running non-interactively.
+    """
     logger.info(f"Parsing tournament code: {code}")
     
     # Extract region prefix if present
@@ -18,16 +23,16 @@ def parse_tournament_code(code):
     
     # If not found in the code, ask the user
     if not day_match:
-        day = input(f"Enter day number for tournament code {code}: ").strip()
+        day = input(f"Enter day number for tournament code {code}: ").strip() if interactive else ""
         if not day:
-            day = "1"  # Default to day 1 if not specified
+            day = default_day  # Default to day 1 if not specified
     else:
         day = day_match.group(1)
         
     if not match_match:
-        match_num = input(f"Enter match number for tournament code {code}: ").strip()
+        match_num = input(f"Enter match number for tournament code {code}: ").strip() if interactive else ""
         if not match_num:
-            match_num = "1"  # Default to match 1 if not specified
+            match_num = default_match  # Default to match 1 if not specified
     else:
         match_num = match_match.group(1)
     
@@ -43,4 +48,36 @@ def parse_tournament_code(code):
 def is_match_id(code):
     """Determine if a code is a match ID rather than a tournament code"""
     # Match IDs usually contain an underscore
-    return "_" in code
\ No newline at end of file
+    return "_" in code
+
+# Regional routing value for each platform ID of a match ID
+PLATFORM_TO_REGION = {
+    "EUW1": "europe",
+    "EUN1": "europe",
+    "NA1": "americas",
+    "KR": "asia",
+    "JP1": "asia",
+    "BR1": "americas",
+    "LA1": "americas",
+    "LA2": "americas",
+    "OC1": "sea",
+    "RU": "europe",
+    "TR1": "europe"
+}
+
+def get_region_from_code(code, default_region=None):
+    """Extract region from tournament code or match ID"""
+    # For match IDs like EUW1_123456789
+    if "_" in code:
+        platform_id = code.split("_")[0]
+        if platform_id in PLATFORM_TO_REGION:
+            return PLATFORM_TO_REGION[platform_id]
+    
+    # For tournament codes like EUW12345
+    region_match = re.match(r'^([A-Z]{2,4})', code)
+    region_code = region_match.group(1).lower() if region_match else None
+    
+    if region_code and region_code in REGION_MAP:
+        return REGION_MAP[region_code]
+    
+    return default_region
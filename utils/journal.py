@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Per-code states, in the order a code goes through them
+CODE_STATES = ["queued", "resolved", "fetched", "extracted", "written"]
+
+class RunJournal:
+    """Append-only journal of a run's progress, one fsync'd JSON record per line
+
+    The first record describes the run (Excel path, exports and codes); every later
+    record moves one code to a new state. Replaying the journal gives the
+    last state reached by each code, so an interrupted run can be resumed.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.run = None
+        self.codes = {}
+        self._lock = threading.Lock()
+
+    def _append(self, record):
+        line = json.dumps(record) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self, excel_path, codes, exports=()):
+        """Start a new run, replacing any previous journal"""
+        if self.path.exists():
+            unfinished = [code for code, entry in self.load().codes.items() if entry["state"] != "written"]
+            if unfinished:
+                logger.warning(f"Discarding journal with {len(unfinished)} unfinished codes: {self.path}")
+            self.path.unlink()
+
+        self.run = {"excel_path": excel_path, "exports": list(exports), "codes": list(codes)}
+        self.codes = {}
+        self._append({"time": time.time(), "run": self.run})
+
+    def add_codes(self, codes):
+        """Add codes to a run that is already in progress"""
+        self.run["codes"].extend(codes)
+        self._append({"time": time.time(), "add_codes": codes})
+
+    def record(self, code, state, **data):
+        """Checkpoint a code reaching a new state"""
+        entry = self.codes.setdefault(code, {"state": None})
+        entry.update(data)
+        entry["state"] = state
+        self._append({"time": time.time(), "code": code, "state": state, **data})
+        logger.debug(f"Journal: {code} -> {state}")
+
+    def state(self, code):
+        """Get the last state reached by a code (None if not started)"""
+        return self.codes.get(code, {}).get("state")
+
+    def get(self, code, key, default=None):
+        """Get data recorded for a code"""
+        return self.codes.get(code, {}).get(key, default)
+
+    def load(self):
+        """Replay the journal file into this object"""
+        self.run = None
+        self.codes = {}
+        if not self.path.exists():
+            return self
+
+        with open(self.path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write can leave a partial last line
+                    logger.warning(f"Skipping unreadable journal line {line_number}")
+                    continue
+
+                if "run" in record:
+                    self.run = record["run"]
+                    self.codes = {}
+                    continue
+
+                if "add_codes" in record:
+                    self.run["codes"].extend(record["add_codes"])
+                    continue
+
+                entry = self.codes.setdefault(record.pop("code"), {"state": None})
+                record.pop("time", None)
+                entry.update(record)
+
+        return self
+
+    def pending_codes(self):
+        """Get the run's codes that have not been written yet"""
+        if not self.run:
+            return []
+        return [code for code in self.run["codes"] if self.state(code) != "written"]
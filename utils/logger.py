@@ -19,7 +19,8 @@ def setup_logging():
         level=level,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         handlers=[
-            logging.FileHandler(LOG_FILE),
+            # The log file is only opened once something is logged
+            logging.FileHandler(LOG_FILE, delay=True),
             logging.StreamHandler(sys.stdout)
         ]
     )
@@ -0,0 +1,165 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from config import PROFILE_DIR, PROFILE_TOP_LINES
+
+logger = logging.getLogger(__name__)
+
+class StageProfiler:
+    """cProfile and tracemalloc profiling of the pipeline's stages
+
+    Each stage (API requests, JSON decoding, stat extraction, workbook
+    writes, ...) gets its own cProfile profile and its own memory figures:
+    tracemalloc runs only while a stage is profiled, so its peak is the
+    stage's own, and a snapshot taken at the end of the stage shows where
+    the memory it kept was allocated.
+
+    Per-match stages are profiled for every `every`-th match only, to keep
+    the overhead low on long runs. Only one stage is profiled at a time: a
+    stage entered while another one is profiled (nested, or from another
+    thread) counts towards that one.
+    """
+
+    def __init__(self, directory, every=1):
+        self.directory = Path(directory)
+        self.every = max(1, every)
+        self.matches = 0
+        self.sampled = True
+        self.profiles = {}
+        self.stages = {}
+        self.allocations = {}
+        self._lock = threading.Lock()
+
+    def next_match(self):
+        """Move on to the next match, deciding whether its stages are profiled"""
+        self.sampled = self.matches % self.every == 0
+        self.matches += 1
+
+    @contextmanager
+    def stage(self, name, per_match=True):
+        """Profile a block of code as part of a stage"""
+        if (per_match and not self.sampled) or not self._lock.acquire(blocking=False):
+            yield
+            return
+
+        try:
+            profile = self.profiles.setdefault(name, cProfile.Profile())
+            tracemalloc.start()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                seconds = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+                self._record(name, seconds, peak, snapshot)
+        finally:
+            self._lock.release()
+
+    def _record(self, name, seconds, peak, snapshot):
+        stats = self.stages.setdefault(name, {"calls": 0, "seconds": 0, "peak_bytes": 0, "kept_bytes": 0})
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["peak_bytes"] = max(stats["peak_bytes"], peak)
+
+        allocations = self.allocations.setdefault(name, {})
+        for statistic in snapshot.statistics("lineno"):
+            line = str(statistic.traceback)
+            allocations[line] = allocations.get(line, 0) + statistic.size
+            stats["kept_bytes"] += statistic.size
+
+    def summary(self):
+        """Get the time and memory figures of every profiled stage, slowest first"""
+        rows = []
+        for name, stats in self.stages.items():
+            rows.append({
+                "stage": name,
+                "calls": stats["calls"],
+                "seconds": round(stats["seconds"], 4),
+                "mean_seconds": round(stats["seconds"] / stats["calls"], 4),
+                "peak_mib": round(stats["peak_bytes"] / 2 ** 20, 2),
+                "kept_mib": round(stats["kept_bytes"] / 2 ** 20, 2),
+            })
+        return sorted(rows, key=lambda row: -row["seconds"])
+
+    def write_reports(self):
+        """Write the hotspot and memory reports of every stage, and the summary, to the run directory
+
+        For each stage: <stage>.prof (a pstats dump), <stage>.txt (functions
+        sorted by cumulative and by own time) and <stage>.memory.txt (lines
+        whose allocations were still alive at the end of the stage).
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        for name, profile in self.profiles.items():
+            profile.dump_stats(self.directory / f"{name}.prof")
+
+            report = io.StringIO()
+            for sort in ("cumulative", "tottime"):
+                report.write(f"=== {name}: sorted by {sort} ===\n")
+                pstats.Stats(profile, stream=report).strip_dirs().sort_stats(sort).print_stats(PROFILE_TOP_LINES)
+            (self.directory / f"{name}.txt").write_text(report.getvalue(), encoding="utf-8")
+
+            allocations = sorted(self.allocations.get(name, {}).items(), key=lambda item: -item[1])
+            lines = [f"{size / 1024:10.1f} KiB  {line}" for line, size in allocations[:PROFILE_TOP_LINES]]
+            (self.directory / f"{name}.memory.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        summary = self.summary()
+        with open(self.directory / "summary.json", "w", encoding="utf-8") as f:
+            json.dump({"every": self.every, "matches": self.matches, "stages": summary}, f, indent=2)
+
+        lines = [f"{'stage':<12}{'calls':>8}{'seconds':>12}{'mean':>10}{'peak MiB':>10}{'kept MiB':>10}"]
+        for row in summary:
+            lines.append(f"{row['stage']:<12}{row['calls']:>8}{row['seconds']:>12.3f}{row['mean_seconds']:>10.4f}"
+                         f"{row['peak_mib']:>10.2f}{row['kept_mib']:>10.2f}")
+        (self.directory / "summary.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        logger.info(f"Wrote profiling reports for {len(summary)} stages to {self.directory}")
+        return "\n".join(lines)
+
+# The run's profiler, if profiling was started
+_profiler = None
+
+def start_profiling(directory=None, every=1):
+    """Start profiling the pipeline's stages, writing reports to directory (a new run directory by default)"""
+    global _profiler
+    directory = directory or Path(PROFILE_DIR) / time.strftime("%Y%m%d-%H%M%S")
+    _profiler = StageProfiler(directory, every)
+    logger.info(f"Profiling stages of every {_profiler.every} matches to {directory}")
+    return _profiler
+
+def stop_profiling():
+    """Stop profiling and write the reports; returns the summary table (None if not profiling)"""
+    global _profiler
+    if _profiler is None:
+        return None
+    profiler, _profiler = _profiler, None
+    return profiler.write_reports()
+
+def next_match():
+    """Tell the profiler (if any) that a new match is being processed"""
+    if _profiler is not None:
+        _profiler.next_match()
+
+@contextmanager
+def stage(name, per_match=True):
+    """Profile a block of code as part of a stage when profiling is on; does nothing otherwise
+
+    Stages run once per batch rather than per match (e.g. workbook writes)
+    pass per_match=False so they are profiled whatever the sampling.
+    """
+    if _profiler is None:
+        yield
+        return
+    with _profiler.stage(name, per_match):
+        yield